@@ -27,6 +27,45 @@ class nginx:
     path: os.PathLike = "/home/amyrin/usercontent"
 
 
+class render:
+    processes: int = 0  # amount of render worker processes, 0 uses the cpu count
+    timeout: float = 60  # seconds before a render worker gets killed
+    cache_path: os.PathLike = "cache/renders"
+    cache_memory: int = 64 * 1024 * 1024  # bytes of render outputs kept in memory
+    cache_disk: int = 1024 * 1024 * 1024  # bytes of render outputs kept on disk
+    makesweet_backend: str = "docker"  # docker, local or stand-in
+    makesweet_binary: str = "makesweet"  # used by the local backend
+    makesweet_workers: int = 2
+    makesweet_prefix: str = "makesweet"  # container names, unique per bot on a host
+
+
+class calculator:
+    workers: int = 1  # expression worker processes
+    timeout: float = 5  # seconds before a calculation gets killed
+    cpu_time: int = 3  # seconds of cpu time per calculation
+    memory: int = 256 * 1024 * 1024  # bytes of address space per worker
+    states_memory: int = 16 * 1024 * 1024  # bytes of user variables kept
+    states_ttl: float = 24 * 60 * 60  # seconds a user's variables are kept unused
+
+
+class executors:  # threads per executor pool, 0 uses the default size
+    cpu: int = 0  # defaults to the cpu count
+    io: int = 0  # defaults to 16
+    render: int = 0  # defaults to 4
+    parse: int = 0  # defaults to 2
+
+
+class tracing:
+    export_path: os.PathLike = None  # prometheus text file the metrics are written to
+    export_interval: float = 15  # seconds between exports
+
+
+class watchdog:
+    interval: float = 0.25  # seconds between loop lag measurements
+    threshold: float = 0.2  # seconds of lag that count as a stall
+    incidents: int = 50  # amount of stalls kept for the lag command
+
+
 class database:
     user: str = "user"
     password: str = "password"
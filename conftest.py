@@ -0,0 +1,34 @@
+import os
+import sys
+import types
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(__file__), "tests", "benchmarks", ".baseline.json"
+)
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # the modules fall back to their defaults for missing settings,
+    # so an empty config is enough to import them without a bot setup
+    sys.modules["config"] = types.ModuleType("config")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench", "imaging benchmark baselines")
+    group.addoption(
+        "--bench-baseline",
+        default=BASELINE_PATH,
+        help="file the results are compared against",
+    )
+    group.addoption(
+        "--bench-save",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing",
+    )
+    group.addoption(
+        "--bench-threshold",
+        type=float,
+        default=0.25,
+        help="relative regression of time or peak rss that fails a benchmark",
+    )
@@ -15,7 +15,6 @@ from textwrap import indent
 from types import ModuleType
 from typing import Callable, Dict, List, Literal, Optional
 
-import aiohttp
 import discord
 import humanfriendly
 import mystbin
@@ -32,7 +31,9 @@ from modules.context import Context
 from modules.util.converters import ascii_list
 from modules.util.database.manager import DatabaseManager
 from modules.util.documentation.parser import DocParser
+from modules.util.fetch import create_session
 from modules.util.handlers.nginx import NginxHandler
+from modules.util.tracing import span, trace
 
 
 def _censor_variables(text: str) -> str:
@@ -74,7 +75,6 @@ class amyrin(commands.Bot):
             None  # aiohttp.ClientSession instance, later defined in self.setup_hook
         )
         self.logger = None  # logging.Logger instance, later defined in self.startup
-        self.expr_states = {}  # expr.py states, in use in modules.util.views.calculator
 
         self.playwright = None  # playwright instance, later defined in self.setup_hook
         self.browser: Browser = (
@@ -236,7 +236,7 @@ class amyrin(commands.Bot):
             user=_db.user,
             password=_db.password,
         )
-        self.session = aiohttp.ClientSession()
+        self.session = create_session()
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch()
         self.bcontext = await self.browser.new_context()
@@ -250,6 +250,26 @@ class amyrin(commands.Bot):
 
         await self.process_commands(message)
 
+    async def process_commands(self, message: discord.Message) -> None:
+        if message.author.bot:
+            return
+
+        with trace() as current:
+            ctx = await self.get_context(message)
+            if ctx.command is not None:
+                current.command = ctx.command.qualified_name
+
+            await self.invoke(ctx)
+            current.failed = ctx.command_failed
+
+    async def get_prefix(self, message: discord.Message):
+        with span("prefix"):
+            return await super().get_prefix(message)
+
+    async def can_run(self, ctx: commands.Context, *, call_once: bool = False) -> bool:
+        with span("checks"):
+            return await super().can_run(ctx, call_once=call_once)
+
     def _generate_ct_name(self, command_name: str):
         for _ in range(100):
             id_part = "".join(random.choices(string.digits, k=5))
@@ -273,17 +293,26 @@ class amyrin(commands.Bot):
             command: commands.Command = ctx.command
             cb = command._original_callback
 
-            task = asyncio.create_task(cb(cog, *args, **kwargs))
-            name = self._generate_ct_name(command.qualified_name)
-            obj = {"user": ctx.author.id, "task": task, "created": datetime.utcnow()}
-            self.command_tasks[name] = obj
-            ctx._task_name = name
-
-            def done_callback(result: asyncio.Future):
-                self.command_tasks.pop(name, None)
-
-            task.add_done_callback(done_callback)
-            return await task
+            # joins the trace of process_commands, interactions start their own
+            with trace() as current:
+                current.command = command.qualified_name  # subcommands over groups
+
+                task = asyncio.create_task(cb(cog, *args, **kwargs))
+                name = self._generate_ct_name(command.qualified_name)
+                obj = {
+                    "user": ctx.author.id,
+                    "task": task,
+                    "created": datetime.utcnow(),
+                }
+                self.command_tasks[name] = obj
+                ctx._task_name = name
+
+                def done_callback(result: asyncio.Future):
+                    self.command_tasks.pop(name, None)
+
+                task.add_done_callback(done_callback)
+                with span("callback"):
+                    return await task
 
         return callback
 
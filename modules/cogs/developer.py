@@ -8,9 +8,11 @@ import re
 import string
 import sys
 import textwrap
+import time
 import traceback
 from copy import copy
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import BytesIO
 from typing import AsyncGenerator, Dict
 
 import discord
@@ -20,6 +22,10 @@ from jishaku.codeblocks import codeblock_converter
 from jishaku.repl import KeywordTransformer
 
 from core.bot import amyrin
+from modules.util.executor import run_in_pool
+from modules.util.metrics import metrics
+from modules.util.process import run
+from modules.util.profiler import profile, running
 from modules.util.updater import Updater
 from modules.views.paginator import WrapList, paginate
 from modules.views.pull import PullView
@@ -128,13 +134,9 @@ class Developer(commands.Cog, command_attrs={"hidden": True}):
     async def cog_check(self, ctx: commands.Context) -> bool:
         return await self.bot.is_owner(ctx.author)
 
-    async def shell(self, code: str, wait: bool = True):
-        proc = await asyncio.subprocess.create_subprocess_shell(
-            code, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        if wait:
-            await proc.wait()
-        return tuple(i.decode() for i in await proc.communicate())
+    async def shell(self, *args: str, timeout: float = 120):
+        result = await run(*args, timeout=timeout)
+        return result.stdout.decode(), result.stderr.decode()
 
     @command(
         commands.group,
@@ -206,7 +208,7 @@ class Developer(commands.Cog, command_attrs={"hidden": True}):
     )
     async def update(self, ctx: commands.Context):
         async with ctx.typing():
-            result = await self.shell("git pull --force --stat")
+            result = await self.shell("git", "pull", "--force", "--stat")
 
         output = "\n".join(i.strip() for i in result)
 
@@ -222,6 +224,95 @@ class Developer(commands.Cog, command_attrs={"hidden": True}):
         embed = discord.Embed(description=description, color=self.bot.color)
         await ctx.send(embed=embed, view=PullView(ctx, modules=modules))
 
+    @command(
+        commands.command,
+        name="metrics",
+        examples=["{prefix}metrics", "{prefix}metrics process_"],
+        permissions=CommandPermissions(template=PermissionTemplates.text_command),
+    )
+    async def _metrics(self, ctx: commands.Context, prefix: str = None):
+        lines = metrics.format(prefix)
+        if not lines:
+            return await ctx.send("No metrics have been recorded yet.")
+
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @command(
+        commands.command,
+        name="lag",
+        examples=["{prefix}lag"],
+        permissions=CommandPermissions(template=PermissionTemplates.text_command),
+    )
+    async def _lag(self, ctx: commands.Context):
+        watchdog = getattr(self.bot, "watchdog", None)
+        if watchdog is None or not watchdog.incidents:
+            return await ctx.send("The event loop has not stalled yet.")
+
+        embeds = []
+        for incident in reversed(watchdog.incidents):
+            duration = (
+                "still blocked"
+                if incident.duration is None
+                else f"{incident.duration * 1000:.0f}ms"
+            )
+            # the innermost frames are the interesting ones
+            stack = (
+                "".join(incident.stack)[-3900:] if incident.stack else "not captured"
+            )
+
+            em = discord.Embed(
+                title=f"Loop blocked for {duration}",
+                description=f"```py\n{stack}```",
+                color=self.bot.color,
+                timestamp=incident.time,
+            )
+            em.add_field(name="Location", value=f"`{incident.location}`", inline=False)
+            em.add_field(name="Task", value=incident.task or "none")
+            embeds.append(em)
+
+        await paginate(ctx, embeds, timeout=30)
+
+    @command(
+        commands.command,
+        name="profile",
+        examples=["{prefix}profile", "{prefix}profile 60 yes"],
+        permissions=CommandPermissions(template=PermissionTemplates.text_command),
+    )
+    async def _profile(
+        self, ctx: commands.Context, duration: float = 15, allocations: bool = False
+    ):
+        if running():
+            return await ctx.send("A profile is already running.")
+
+        duration = min(max(duration, 1), 300)
+        await ctx.send(
+            f"Profiling every thread for {duration:g}s"
+            + (" with allocation tracking." if allocations else ".")
+        )
+
+        result = await profile(duration, allocations=allocations)
+        summary = await run_in_pool("cpu", result.summary)
+        folded = await run_in_pool("cpu", result.folded)
+
+        name = f"profile-{int(time.time())}"
+        files = [discord.File(BytesIO(folded.encode()), filename=f"{name}.folded")]
+        content = "The attached stacks load into speedscope or flamegraph.pl."
+
+        try:
+            paste = await self.bot.myst.create_paste(
+                filename=f"{name}.txt",
+                content=summary,
+                expires=datetime.utcnow() + timedelta(days=1),
+            )
+        except Exception:  # the summary is attached instead
+            files.append(
+                discord.File(BytesIO(summary.encode()), filename=f"{name}.txt")
+            )
+        else:
+            content = f"Summary: {paste}\n{content}"
+
+        await ctx.send(content, files=files, edit=False)
+
     @command(
         commands.command,
         aliases=["rs"],
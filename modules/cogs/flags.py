@@ -4,6 +4,8 @@ from typing import Any, Dict
 
 from discord.ext import commands
 
+from modules.util.tracing import traced
+
 
 class InvalidTypeException(Exception):
     pass
@@ -92,6 +94,7 @@ class FlagParser(commands.Converter):
 
         return matches
 
+    @traced("convert_flags")
     async def convert(self, ctx: commands.Context, argument: str) -> Dict[str, Any]:
         return await self._find_matches(ctx, argument)
 
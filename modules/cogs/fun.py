@@ -1,8 +1,8 @@
 import discord
-import expr
 from discord.ext import commands
 
 from core.bot import amyrin
+from modules.util.calculator import evaluate
 from modules.views.calculator import CalculatorView, start_calculator
 
 from . import *
@@ -13,8 +13,6 @@ class Fun(commands.Cog):
         super().__init__()
         self.bot: amyrin = bot
 
-        self.expr_states = {}
-
     @command(
         description="Open calculator or calculate given expression",
         examples=["{prefix}calculator", "{prefix}calculate 1+1", "{prefix}calc 861/95"],
@@ -32,13 +30,9 @@ class Fun(commands.Cog):
             return await start_calculator(ctx)
 
         em = discord.Embed(color=self.bot.color)
-        if ctx.author.id not in self.bot.expr_states:
-            self.bot.expr_states[ctx.author.id] = expr.create_state()
-
-        state = self.bot.expr_states[ctx.author.id]
 
         try:
-            res = await self.bot.loop.run_in_executor(None, state.evaluate, expression)
+            res = await evaluate(ctx.author.id, expression)
         except Exception as exc:
             if hasattr(exc, "friendly"):
                 error = exc.friendly
@@ -1,6 +1,5 @@
 import inspect
 import textwrap
-from io import BytesIO
 
 import discord
 import humanfriendly
@@ -8,14 +7,17 @@ from discord.ext import commands
 
 from core.bot import amyrin
 from modules.util.converters import ascii_list
-from modules.util.imaging.converter import ImageConverter
+from modules.util.imaging.assets import get_info
+from modules.util.imaging.converter import ImageConverter, read_asset
 from modules.util.imaging.exceptions import (CharacterLimitExceeded,
                                              InvalidTemplate, TooManyFrames)
-from modules.util.imaging.renderer import Renders, render
+from modules.util.imaging.renderer import Renders, cached_render
 from modules.util.imaging.utils import SequentialImageProcessor
 
 from . import *
 
+DEFAULT_FILESIZE_LIMIT = 8 * 1024 * 1024  # upload limit outside of guilds
+
 
 class Updater:
     def __init__(self, context: commands.Context):
@@ -49,7 +51,7 @@ class Imaging(commands.Cog):
     ) -> None:
         async with Updater(ctx):
             try:
-                result = await render(
+                result = await cached_render(
                     Renders.makesweet, template, size, *images, **kwargs
                 )
             except CharacterLimitExceeded as exc:
@@ -57,10 +59,10 @@ class Imaging(commands.Cog):
                     f"One of the given texts ({exc.length}) exceeds the maximum character limit of {exc.limit} characters"
                 )
 
-            filename = "image.gif" if result.is_animated else "image.png"
+            filename = "image." + result.extension
             render_time = humanfriendly.format_timespan(result.took / 1000)
             await ctx.send(
-                f"Rendered in `{render_time}`",
+                f"Rendered in `{render_time}`" + (" (cached)" if result.cached else ""),
                 file=discord.File(result.buffer, filename=filename),
             )
 
@@ -76,12 +78,22 @@ class Imaging(commands.Cog):
         async with Updater(ctx):
             image, _ = await ImageConverter().convert(ctx, url, fallback=False)
 
+            # the size and the probed metadata come from the downloaded bytes,
+            # decoding is only needed for the colors
+            size = len(image.getvalue())
+            info = get_info(image)
+
             processor = SequentialImageProcessor(image)
             await processor._init()
             img = processor.image
-            frames = len(img.sequence)
 
-            dimensions = f"{img.width}x{img.height}"
+            if info is not None:
+                frames = info.frames
+                dimensions = f"{info.width}x{info.height}"
+            else:
+                frames = len(img.sequence)
+                dimensions = f"{img.width}x{img.height}"
+
             colorspace = img.colorspace
 
             dominant_colors = (await processor.get_dominant_colors())[:6]
@@ -89,8 +101,6 @@ class Imaging(commands.Cog):
                 dominant_colors
             )
 
-            buf = await processor.save()
-            size = buf.read().__sizeof__()
             avg_size = size / frames
 
             fmt_size = humanfriendly.format_size(size)
@@ -138,8 +148,8 @@ class Imaging(commands.Cog):
                 text = url
 
             if image is None:
-                image = BytesIO(
-                    await ctx.author.avatar.with_size(1024).with_format("png").read()
+                image = await read_asset(
+                    ctx.author.avatar.with_size(1024).with_format("png")
                 )
         elif image is not None and not text:
             raise commands.MissingRequiredArgument(
@@ -147,10 +157,14 @@ class Imaging(commands.Cog):
             )
 
         timeout = 30
+        size_target = ctx.guild.filesize_limit if ctx.guild else DEFAULT_FILESIZE_LIMIT
         async with Updater(ctx):
             try:
                 result = await asyncio.wait_for(
-                    render(Renders.caption, image, text), timeout=timeout
+                    cached_render(
+                        Renders.caption, image, text, size_target=size_target
+                    ),
+                    timeout=timeout,
                 )
             except CharacterLimitExceeded as exc:
                 return await ctx.send(
@@ -165,11 +179,22 @@ class Imaging(commands.Cog):
                     f"Captioning task exceeded the maximum time of {timeout} seconds and has therefore been cancelled."
                 )
 
-            filename = "image." + ("gif" if result.is_animated else "png")
+            filename = "image." + result.extension
             render_time = humanfriendly.format_timespan(result.took / 1000)
+            fmt_size = humanfriendly.format_size(len(result.buffer.getvalue()))
+
+            if result.cached:
+                details = f"cached, `{fmt_size}`"
+            elif result.encoding:
+                encode_time = humanfriendly.format_timespan(result.encoding.took)
+                details = (
+                    f"{result.encoding.format} encoded in `{encode_time}`, `{fmt_size}`"
+                )
+            else:
+                details = f"`{fmt_size}`"
 
             await ctx.send(
-                content=f"Processed in `{render_time}`",
+                content=f"Processed in `{render_time}` ({details})",
                 file=discord.File(result.buffer, filename=filename),
             )
 
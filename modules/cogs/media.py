@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import random
@@ -5,6 +6,7 @@ import tempfile
 import textwrap
 from urllib.parse import urlparse
 
+import aiohttp
 import discord
 import humanfriendly
 from discord.ext import commands
@@ -12,6 +14,7 @@ from discord.ext import commands
 from core.bot import amyrin
 from modules.util.converters import (FileConverter, URLConverter, URLObject,
                                      format_list)
+from modules.util.fetch import ResponseTooLarge, download_to_file
 from modules.util.handlers.nginx import NginxHandlerExceededSizeLimit
 from modules.util.media.downloader import Downloader, FileDownload, URLDownload
 from modules.util.media.exceptions import (AgeLimited,
@@ -19,15 +22,21 @@ from modules.util.media.exceptions import (AgeLimited,
                                            InvalidFormat, LiveStream,
                                            MediaException, MissingNginxHandler,
                                            TooLong, ValidityCheckFailed)
+from modules.util.media.recognizer import SongRecognizer
+from modules.util.process import ProcessTimeout
 
 from . import *
 from .flags import DownloadFlags
 
 
+RECOGNITION_SIZE_LIMIT = 128 * 1024 * 1024  # 128 mb
+
+
 class Media(commands.Cog):
     def __init__(self, bot):
         super().__init__()
         self.bot: amyrin = bot
+        self.recognizer = SongRecognizer(workers=2)
 
     async def _process_download(
         self, ctx, url: str, format: str, compress: bool, include_tags: bool
@@ -113,6 +122,10 @@ class Media(commands.Cog):
                         f"Video with duration {duration} exceeds the maximum limit of {limit}."
                     )
                 return await ctx.send("Unable to get duration of video, panicking.")
+            except ProcessTimeout as exc:
+                return await update(
+                    f"`{exc.command[0]}` took longer than {humanfriendly.format_timespan(exc.timeout)} and has been cancelled."
+                )
             except json.JSONDecodeError as exc:
                 if random.randint(1, 1000) == 591:
                     reason = "of gas leak!?!??!?"
@@ -240,7 +253,10 @@ class Media(commands.Cog):
         ]
 
         if isinstance(file, URLObject):
-            resp = await self.bot.session.head(file.url)
+            try:
+                resp = await self.bot.session.head(file.url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return await update("Failed to reach the given URL.")
 
             if resp.headers.get("Content-Type") not in content_types:
                 parsed_url = urlparse(file.url)
@@ -275,44 +291,35 @@ class Media(commands.Cog):
 
                 path = download.path
             else:
-                await update(content="Downloading file...")
                 path = os.path.join(temp_dir.name, "song.mp3")
-                data = await file.read()
-                if len(data) > 134217728:
-                    return await update("File cannot be over 128MB.")
-
-                await file.save(path, data=data)
         elif isinstance(file, discord.Attachment):
-            await update(content="Downloading file...")
+            if file.size > RECOGNITION_SIZE_LIMIT:
+                return await update("File cannot be over 128MB.")
+
             parsed_url = urlparse(file.url)
             path = os.path.join(temp_dir.name, parsed_url.path.split("/")[-1])
-            data = await file.read()
-            if len(data) > 134217728:
-                return await update("File cannot be over 128MB.")
 
-            await file.save(path)
+        if not os.path.isfile(path):
+            await update(content="Downloading file...")
+            try:
+                await download_to_file(
+                    self.bot.session, file.url, path, limit=RECOGNITION_SIZE_LIMIT
+                )
+            except ResponseTooLarge:
+                return await update("File cannot be over 128MB.")
+            except asyncio.TimeoutError:
+                return await update("Downloading the file timed out.")
+            except aiohttp.ClientError:
+                return await update("Failed to download the file.")
 
         await update(content="Now processing request...")
 
         try:
-            proc = await asyncio.wait_for(
-                asyncio.create_subprocess_shell(
-                    f'songrec audio-file-to-recognized-song "{path}"',
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                ),
-                timeout=60,
-            )
-        except asyncio.TimeoutError:
+            data = await self.recognizer.recognize(path)
+        except ProcessTimeout as exc:
             return await update(
-                f"Recognition took over 60 seconds and has therefore been cancelled"
+                f"Recognition took over {exc.timeout} seconds and has therefore been cancelled"
             )
-
-        stdout, _ = await proc.communicate()
-        stdout = stdout.decode()
-
-        try:
-            data = json.loads(stdout)
         except json.JSONDecodeError:
             return await update("Failed to parse songrec output.")
 
@@ -10,6 +10,7 @@ import psutil
 from discord.ext import commands
 
 from core.bot import amyrin
+from modules.util.executor import pool_stats, run_in_pool
 
 from . import *
 
@@ -116,7 +117,7 @@ class Meta(commands.Cog):
                 comments,
                 lines,
                 characters,
-            ) = await self.bot.loop.run_in_executor(None, line_count)
+            ) = await run_in_pool("io", line_count)
 
         pid = os.getpid()
         process = psutil.Process(pid)
@@ -162,6 +163,22 @@ Disk Used: {psutil.disk_usage(str(path)).percent}%
 """,
         )
 
+        pools = pool_stats()
+        if pools:
+            pools_str = "\n".join(
+                f"{name}: {stats['active']}/{stats['size']} busy, {stats['queued']} queued"
+                for name, stats in pools.items()
+            )
+            em.add_field(
+                name="Executor Pools",
+                value=f"""
+```py
+{pools_str}
+```
+""",
+                inline=False,
+            )
+
         await ctx.send(embed=em)
 
 
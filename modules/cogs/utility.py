@@ -9,6 +9,7 @@ from discord.ext import commands
 
 from core.bot import amyrin
 from modules.util.converters import FileConverter, URLObject
+from modules.util.fetch import ResponseTooLarge
 from modules.util.handlers.nginx import (NginxHandlerExceededSizeLimit,
                                          NginxHandlerException)
 from modules.util.updater import Updater
@@ -154,9 +155,20 @@ class Utility(commands.Cog):
             default=None,
         ),
     ):
-        file: URLObject = await FileConverter().convert(ctx, file)
+        file: discord.Attachment | URLObject = await FileConverter().convert(ctx, file)
+        limit = self.bot.nginx._limit
 
-        buffer = BytesIO(await file.read())
+        try:
+            if isinstance(file, discord.Attachment):
+                # the size of attachments is known up front, read() has no limit
+                if file.size > limit:
+                    raise ResponseTooLarge(file.size, limit)
+                buffer = BytesIO(await file.read())
+            else:
+                buffer = BytesIO(await file.read(limit=limit))
+        except ResponseTooLarge as exc:
+            exceeded = humanfriendly.format_size(exc.size - exc.limit)
+            return await ctx.send(f"Given file exceeds file limit by {exceeded}.")
 
         try:
             url = await self.bot.nginx.add(buffer, filename=file.filename)
@@ -11,6 +11,7 @@ from discord.ext.commands.context import DeferTyping
 
 import config
 from modules.util.imaging.converter import ImageConverter
+from modules.util.tracing import traced
 
 
 class EditTyping(Typing):
@@ -48,6 +49,7 @@ class Context(commands.Context):
         self.command = command
         return await command(*args, **kwargs)
 
+    @traced("send")
     async def send(self, content: str = None, edit: bool = True, *args, **kwargs):
         if edit and self.message.id in self.bot.command_cache.keys():
             entries = self.bot.command_cache[self.message.id]
@@ -13,6 +13,7 @@ from jishaku.math import natural_size
 from jishaku.modules import package_version
 
 from core.bot import amyrin
+from modules.util.executor import pool_stats
 
 jishaku.Flags.NO_DM_TRACEBACK = True
 jishaku.Flags.NO_UNDERSCORE = True
@@ -84,6 +85,18 @@ class Jishaku(*OPTIONAL_FEATURES, *STANDARD_FEATURES):
                     except psutil.AccessDenied:
                         pass
 
+                    pools = pool_stats()
+                    if pools:
+                        summary.append(
+                            "Executor pools: "
+                            + ", ".join(
+                                f"{name} {stats['active']}/{stats['size']} busy "
+                                f"({stats['queued']} queued, p95 wait {stats['queue_p95'] * 1000:.0f}ms)"
+                                for name, stats in pools.items()
+                            )
+                            + "."
+                        )
+
                     summary.append("")  # blank line
             except psutil.AccessDenied:
                 summary.append(
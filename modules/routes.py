@@ -1,16 +1,40 @@
 import os
 from typing import Dict
 
+import discord
 from discord.ext import commands
 from discord.ext.ipc.objects import ClientPayload
 from discord.ext.ipc.server import Server
 
+from modules.util.executor import pool_stats
+from modules.util.metrics import Histogram, metrics
+
+
+def _summarize(histogram: Histogram) -> Dict:
+    return {
+        "count": histogram.count,
+        "avg": histogram.average,
+        "p50": histogram.percentile(50),
+        "p95": histogram.percentile(95),
+        "p99": histogram.percentile(99),
+    }
+
 
 class Routes(commands.Cog):
+    """IPC routes for the dashboard, every route is cheap enough to be polled often.
+
+    Users are counted per guild when the guild becomes available and are kept
+    up to date from member events, so requests never iterate the members.
+    """
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.humans: Dict[int, int] = {}  # guild id -> amount of non-bot members
 
     async def cog_load(self) -> None:
+        if self.bot.is_ready():  # reloaded, the guilds will not become available again
+            self._count_all()
+
         if self.bot.ipc is not None and not self.bot.ipc.started:
             await self.bot.ipc.start()
 
@@ -18,18 +42,83 @@ class Routes(commands.Cog):
         await self.bot.ipc.stop()
         self.bot.ipc = None
 
+    def _count(self, guild: discord.Guild) -> None:
+        self.humans[guild.id] = sum(not x.bot for x in guild.members)
+
+    def _count_all(self) -> None:
+        for guild in self.bot.guilds:
+            if guild.id not in self.humans:
+                self._count(guild)
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        self._count_all()
+
+    @commands.Cog.listener("on_guild_join")
+    @commands.Cog.listener("on_guild_available")
+    async def on_guild_added(self, guild: discord.Guild) -> None:
+        self._count(guild)
+
+    @commands.Cog.listener("on_guild_remove")
+    @commands.Cog.listener("on_guild_unavailable")
+    async def on_guild_removed(self, guild: discord.Guild) -> None:
+        self.humans.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        if not member.bot and member.guild.id in self.humans:
+            self.humans[member.guild.id] += 1
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # the raw event also fires for members that were not cached
+        if not payload.user.bot and payload.guild_id in self.humans:
+            self.humans[payload.guild_id] -= 1
+
     @Server.route()
     async def get_users_and_guilds(self, data: ClientPayload) -> Dict:
         await self.bot.wait_until_ready()
 
-        users = 0
-
-        for guild in self.bot.guilds:
-            users += sum(not x.bot for x in guild.members)
-
+        users = sum(self.humans.values())
         guilds = len(self.bot.guilds)
         return {"users": users, "guilds": guilds}
 
+    @Server.route()
+    async def get_command_latency(self, data: ClientPayload) -> Dict:
+        latencies = {}
+        for _, labels, histogram in metrics.collect("command_seconds"):
+            latencies[dict(labels)["command"]] = {**_summarize(histogram), "stages": {}}
+
+        for _, labels, histogram in metrics.collect("command_stage_seconds"):
+            labels = dict(labels)
+            command = latencies.get(labels["command"])
+            if command is not None:
+                command["stages"][labels["stage"]] = _summarize(histogram)
+
+        return {"commands": latencies}
+
+    @Server.route()
+    async def get_cache_sizes(self, data: ClientPayload) -> Dict:
+        caches = {}
+        for name, labels, gauge in metrics.collect("cache_"):
+            if name in ("cache_size", "cache_entries"):
+                cache = caches.setdefault(dict(labels)["cache"], {})
+                cache[name[len("cache_") :]] = gauge.value
+
+        render = {
+            dict(labels)["tier"]: gauge.value
+            for _, labels, gauge in metrics.collect("render_cache_bytes")
+        }
+        return {
+            "caches": caches,
+            "render_cache_bytes": render,
+            "command_cache": len(self.bot.command_cache),
+        }
+
+    @Server.route()
+    async def get_executor_stats(self, data: ClientPayload) -> Dict:
+        return {"pools": pool_stats()}
+
 
 async def setup(bot):
     await bot.add_cog(Routes(bot))
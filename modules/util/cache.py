@@ -0,0 +1,98 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from modules.util.metrics import metrics
+
+
+class LRUCache:
+    """A size bounded mapping that evicts the least recently used entries.
+
+    By default maxsize is an amount of entries, passing sizeof makes it a budget
+    of the summed sizes instead. Entries older than ttl seconds are treated as missing.
+    Lookups are counted in the cache_requests_total metric under the cache's name,
+    the size and the amount of entries are kept in the cache_size and cache_entries gauges.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        *,
+        ttl: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.size = 0
+
+        self._sizeof = sizeof or (lambda _: 1)
+        self._data: OrderedDict = OrderedDict()  # key -> (value, size, expires)
+
+        self._hits = metrics.counter("cache_requests_total", cache=name, result="hit")
+        self._misses = metrics.counter(
+            "cache_requests_total", cache=name, result="miss"
+        )
+        self._evictions = metrics.counter("cache_evictions_total", cache=name)
+        self._size = metrics.gauge("cache_size", cache=name)
+        self._entries = metrics.gauge("cache_entries", cache=name)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        try:
+            value, _, expires = self._data[key]
+        except KeyError:
+            self._misses.inc()
+            return default
+
+        if expires is not None and expires < time.monotonic():
+            del self[key]
+            self._misses.inc()
+            return default
+
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        if size > self.maxsize:
+            return
+
+        if key in self._data:
+            del self[key]
+
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, size, expires)
+        self.size += size
+
+        while self.size > self.maxsize:
+            _, (_, evicted, _) = self._data.popitem(last=False)
+            self.size -= evicted
+            self._evictions.inc()
+
+        self._update_gauges()
+
+    def __delitem__(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self.size -= size
+        self._update_gauges()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        self._size.set(self.size)
+        self._entries.set(len(self._data))
+
+
+async def setup(bot):
+    pass
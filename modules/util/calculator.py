@@ -0,0 +1,110 @@
+import asyncio
+import math
+import resource
+import sys
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+import config
+from modules.util.cache import LRUCache
+from modules.util.process import ResourceLimits
+from modules.util.workers import WorkerCrashed, WorkerPool, get_worker_pool
+
+Variables = Dict[str, Decimal]
+
+_state = None  # the expr parser of a worker, shared by every user
+_defaults: Variables = {}  # constants the parser starts with
+
+
+class EvaluationFailed(Exception):
+    def __init__(self, friendly: str) -> None:
+        self.friendly = friendly
+        super().__init__(friendly)
+
+
+def _sizeof(variables: Variables) -> int:
+    return sys.getsizeof(variables) + sum(
+        sys.getsizeof(name) + sys.getsizeof(value) for name, value in variables.items()
+    )
+
+
+def _warm_worker() -> None:
+    global _state, _defaults
+    import expr
+
+    _state = expr.create_state()
+    _state.evaluate("0")  # builds the parser and lexer
+    _defaults = dict(_state._variables)
+
+
+def _evaluate(
+    expression: str, variables: Variables, cpu_time: int
+) -> Tuple[Optional[Decimal], Variables]:
+    # the rlimit counts the whole lifetime of the worker, so it is moved along per job
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(used.ru_utime + used.ru_stime) + cpu_time
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    _state._variables = {**_defaults, **variables}
+    result = _state.evaluate(expression)
+
+    # only what the user declared is sent back and stored
+    declared = {
+        name: value
+        for name, value in _state._variables.items()
+        if _defaults.get(name) != value
+    }
+    return result, declared
+
+
+_config = getattr(config, "calculator", None)  # configs from before this section
+CPU_TIME = getattr(_config, "cpu_time", 3)
+
+calculator_pool = WorkerPool(
+    "calculator",
+    getattr(_config, "workers", 1),
+    initializer=_warm_worker,
+    limits=ResourceLimits(memory=getattr(_config, "memory", 256 * 1024 * 1024)),
+    timeout=getattr(_config, "timeout", 5),
+)
+
+# variables declared by each user, the parser itself lives in the workers
+states = LRUCache(
+    "calculator_states",
+    maxsize=getattr(_config, "states_memory", 16 * 1024 * 1024),
+    ttl=getattr(_config, "states_ttl", 24 * 60 * 60),
+    sizeof=_sizeof,
+)
+
+
+async def evaluate(user_id: int, expression: str) -> Optional[Decimal]:
+    """Evaluates the expression in a worker with the user's variables.
+
+    Expressions that take too long or use too much cpu time kill the worker
+    running them and raise EvaluationFailed, other errors come from expr.
+    """
+    pool = get_worker_pool("calculator")  # importers keep this function over reloads
+    try:
+        result, variables = await pool.submit(
+            _evaluate, expression, states.get(user_id, {}), CPU_TIME
+        )
+    except asyncio.TimeoutError:
+        raise EvaluationFailed("[TIMEOUT] The calculation took too long")
+    except (WorkerCrashed, MemoryError):  # crashes are the cpu time limit
+        raise EvaluationFailed("[LIMIT] The calculation used too many resources")
+
+    if variables:
+        states[user_id] = variables
+    elif user_id in states:
+        del states[user_id]
+
+    return result
+
+
+async def setup(bot):
+    bot.calculator_pool = calculator_pool
+
+
+async def teardown(bot):
+    calculator_pool.close()
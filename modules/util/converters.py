@@ -9,6 +9,8 @@ import aiohttp
 import discord
 from discord.ext import commands
 
+from modules.util.fetch import read_limited
+
 MENTION_REGEX = re.compile(r"<@(!?)([0-9]*)>")
 
 
@@ -42,18 +44,21 @@ URL_REGEX = re.compile(
 
 
 class URLObject:
-    def __init__(self, url: str):
+    def __init__(self, url: str, session: aiohttp.ClientSession = None):
         if not URL_REGEX.match(url):
             raise TypeError(f"Invalid url provided")
         self.url = url
         self.filename = url.split("/")[-1]
+        self._session = session
 
-    async def read(self, *, session=None) -> bytes:
-        """Reads this asset."""
-        _session = session or aiohttp.ClientSession()
+    async def read(self, *, session=None, limit: int = None) -> bytes:
+        """Reads this asset, optionally aborting once it exceeds the limit."""
+        _session = session or self._session or aiohttp.ClientSession()
         try:
             async with _session.get(self.url) as resp:
                 if resp.status == 200:
+                    if limit is not None:
+                        return await read_limited(resp, limit)
                     return await resp.read()
                 elif resp.status == 404:
                     raise discord.NotFound(resp, "asset not found")
@@ -62,7 +67,7 @@ class URLObject:
                 else:
                     raise discord.HTTPException(resp, "failed to get asset")
         finally:
-            if not session:
+            if _session is not session and _session is not self._session:
                 await _session.close()
 
     async def save(
@@ -160,6 +165,8 @@ class FileConverter(commands.Converter):
                     inspect.Parameter("file", inspect.Parameter.KEYWORD_ONLY)
                 )
         else:
-            attachment = URLObject(await URLConverter().convert(ctx, file))
+            attachment = URLObject(
+                await URLConverter().convert(ctx, file), session=ctx.bot.session
+            )
 
         return attachment
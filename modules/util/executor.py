@@ -1,21 +1,138 @@
 import asyncio
 import functools
-from typing import Callable
+import os
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
 
 from discord.ext import commands
 
+from modules.util.metrics import metrics
+from modules.util.tracing import span
+from modules.util.workers import worker_pools
 
-async def run_blocking_func(func: Callable, *args, **kwargs):
+# workload classes, a burst in one pool doesn't starve the others
+POOL_SIZES = {
+    "cpu": os.cpu_count() or 1,  # numpy, pillow and other gil releasing work
+    "io": 16,  # file access and other calls that mostly wait
+    "render": 4,  # wand and imagemagick work in the bot process
+    "parse": 2,  # beautifulsoup and source indexing
+}
+DEFAULT_POOL = "io"
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+
+
+def _pool_size(name: str) -> int:
+    import config  # render workers import this module too, the config is read lazily
+
+    return getattr(getattr(config, "executors", None), name, None) or POOL_SIZES[name]
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        if name not in POOL_SIZES:
+            raise ValueError(f'unknown executor pool "{name}"')
+
+        pool = ThreadPoolExecutor(
+            max_workers=_pool_size(name), thread_name_prefix=f"executor-{name}"
+        )
+        _pools[name] = pool
+
+    return pool
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Returns the size, queue depth, active threads and timings of every started pool.
+
+    Worker process pools are included as well, their active count is busy workers.
+    """
+    stats = {}
+    for name, pool in _pools.items():
+        queue = metrics.histogram("executor_queue_seconds", pool=name)
+        run = metrics.histogram("executor_run_seconds", pool=name)
+        stats[name] = {
+            "size": pool._max_workers,
+            "queued": metrics.gauge("executor_queue_depth", pool=name).value,
+            "active": metrics.gauge("executor_active", pool=name).value,
+            "jobs": run.count,
+            "queue_p95": queue.percentile(95),
+            "run_p95": run.percentile(95),
+        }
+
+    for pool in worker_pools():
+        stats[f"{pool.name} processes"] = pool.stats()
+
+    return stats
+
+
+def _submit(name: str, func: Callable) -> Future:
+    pool = get_pool(name)
+    queue_depth = metrics.gauge("executor_queue_depth", pool=name)
+    active = metrics.gauge("executor_active", pool=name)
+    submitted = time.perf_counter()
+    queue_depth.inc()
+
+    def on_done(future: Future) -> None:
+        # only jobs that never started can be cancelled, run didn't leave the queue
+        if future.cancelled():
+            queue_depth.dec()
+
+    def run():
+        queue_depth.dec()
+        metrics.histogram("executor_queue_seconds", pool=name).observe(
+            time.perf_counter() - submitted
+        )
+
+        active.inc()
+        try:
+            with metrics.histogram("executor_run_seconds", pool=name).time():
+                return func()
+        finally:
+            active.dec()
+
+    future = pool.submit(run)
+    future.add_done_callback(on_done)
+    return future
+
+
+async def run_in_pool(
+    pool: Optional[str | Executor], func: Callable, *args, **kwargs
+) -> object:
+    """Runs a blocking function in a named pool, or in the given executor"""
     partial = functools.partial(func, *args, **kwargs)
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, partial)
 
+    if isinstance(pool, Executor):
+        with span("executor"):
+            return await loop.run_in_executor(pool, partial)
+
+    name = pool or DEFAULT_POOL
+    with span(f"executor_{name}"):
+        return await asyncio.wrap_future(_submit(name, partial))
+
+
+def map_in_pool(name: str, func: Callable, iterable: Iterable) -> List:
+    """Runs func for every item in a named pool and waits for the results, from sync code.
+
+    Calling it from a thread of the same pool can deadlock once every thread waits.
+    """
+    futures = [_submit(name, functools.partial(func, item)) for item in iterable]
+    return [future.result() for future in futures]
+
+
+async def run_blocking_func(func: Callable, *args, **kwargs):
+    return await run_in_pool(DEFAULT_POOL, func, *args, **kwargs)
+
+
+def executor(executor: Optional[str | Executor] = None):
+    """Makes a blocking function awaitable, it runs in the named pool or executor"""
 
-def executor(executor=None):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            return run_blocking_func(func, *args, **kwargs)
+            return run_in_pool(executor, func, *args, **kwargs)
 
         return wrapper
 
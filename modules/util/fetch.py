@@ -0,0 +1,114 @@
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import aiohttp
+
+from modules.util.metrics import metrics
+
+CHUNK_SIZE = 64 * 1024  # 64 KiB
+# no total on the shared session, it would cap long transfers like downloads
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+FETCH_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Creates the shared session, with pooled connections and cached DNS lookups"""
+    connector = aiohttp.TCPConnector(
+        limit=100, limit_per_host=20, ttl_dns_cache=300, enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+
+
+class ResponseTooLarge(Exception):
+    def __init__(self, size: int, limit: int, *args: object) -> None:
+        self.size = size
+        self.limit = limit
+
+        super().__init__(*args)
+
+
+class InvalidContentType(Exception):
+    def __init__(self, content_type: Optional[str], *args: object) -> None:
+        self.content_type = content_type
+
+        super().__init__(*args)
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    url: str
+    data: bytes
+    content_type: Optional[str]
+
+
+async def read_limited(resp: aiohttp.ClientResponse, limit: int) -> bytes:
+    """Reads a response body in chunks, aborting as soon as it exceeds the limit"""
+    if resp.content_length is not None and resp.content_length > limit:
+        raise ResponseTooLarge(resp.content_length, limit)
+
+    data = bytearray()
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        data.extend(chunk)
+        if len(data) > limit:
+            raise ResponseTooLarge(len(data), limit)
+
+    return bytes(data)
+
+
+async def download_to_file(
+    session: aiohttp.ClientSession, url: str, path: os.PathLike, limit: int
+) -> int:
+    """Streams a URL to disk without buffering it in memory, returns the amount of bytes written"""
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+
+        if resp.content_length is not None and resp.content_length > limit:
+            raise ResponseTooLarge(resp.content_length, limit)
+
+        written = 0
+        with open(path, "wb") as f:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                written += len(chunk)
+                if written > limit:
+                    raise ResponseTooLarge(written, limit)
+                f.write(chunk)
+
+    return written
+
+
+async def fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    *,
+    limit: int,
+    content_types: Optional[Iterable[str]] = None,
+    timeout: aiohttp.ClientTimeout = FETCH_TIMEOUT,
+    **kwargs,
+) -> FetchResult:
+    """Fetches a URL, checking the headers before any of the body is read.
+
+    Oversized or wrongly typed responses are rejected after the header round-trip
+    and bodies without a Content-Length are aborted as soon as they exceed the limit.
+    """
+    async with session.get(url, timeout=timeout, **kwargs) as resp:
+        resp.raise_for_status()
+
+        content_type = resp.headers.get("Content-Type") and resp.content_type
+        if content_types is not None and content_type not in content_types:
+            metrics.counter("fetch_total", result="invalid_type").inc()
+            raise InvalidContentType(content_type)
+
+        try:
+            data = await read_limited(resp, limit)
+        except ResponseTooLarge:
+            metrics.counter("fetch_total", result="too_large").inc()
+            raise
+
+    metrics.counter("fetch_total", result="ok").inc()
+    metrics.counter("fetch_bytes_total").inc(len(data))
+    return FetchResult(url, data, content_type)
+
+
+async def setup(bot):
+    pass
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from PIL import Image, UnidentifiedImageError
+
+from modules.util.cache import LRUCache
+
+ASSET_CACHE_SIZE = 128 * 1024 * 1024  # 128 mb
+ASSET_TTL = 10 * 60  # seconds
+DISCORD_CDN_HOSTS = ("cdn.discordapp.com", "media.discordapp.net")
+SIGNATURE_PARAMS = ("ex", "is", "hm")  # attachment url expiry, not the content
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    format: str
+    width: int
+    height: int
+    frames: int
+
+
+def _skip_sub_blocks(data: bytes, pos: int) -> int:
+    while size := data[pos]:
+        pos += size + 1
+    return pos + 1
+
+
+def scan_gif(data: bytes, limit: Optional[int] = None) -> List[Optional[int]]:
+    """Returns the durations of the frames of a GIF by walking its blocks.
+
+    Nothing is decompressed, so this is cheap even for huge GIFs. Frames without
+    a delay get None. Scanning stops once more than limit frames were found.
+    """
+    if data[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("not a gif")
+
+    durations = []
+    delay = None
+
+    try:
+        flags = data[10]
+        pos = 13
+        if flags & 0x80:  # global color table
+            pos += 3 << ((flags & 0x07) + 1)
+
+        while pos < len(data):
+            block = data[pos]
+            if block == 0x21:  # extension
+                label = data[pos + 1]
+                pos += 2
+                if label == 0xF9 and data[pos] >= 4:  # graphic control extension
+                    delay = int.from_bytes(data[pos + 2 : pos + 4], "little") * 10
+                pos = _skip_sub_blocks(data, pos)
+            elif block == 0x2C:  # image descriptor
+                flags = data[pos + 9]
+                pos += 10
+                if flags & 0x80:  # local color table
+                    pos += 3 << ((flags & 0x07) + 1)
+                pos = _skip_sub_blocks(data, pos + 1)  # after the lzw code size
+
+                durations.append(delay)
+                delay = None
+                if limit is not None and len(durations) > limit:
+                    break
+            else:  # trailer or garbage
+                break
+    except IndexError:  # truncated, the frames read so far still count
+        pass
+
+    return durations
+
+
+def probe(data: bytes) -> Optional[ImageInfo]:
+    """Reads the format, size and frame count without decoding the image"""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if img.format == "GIF":
+                frames = len(scan_gif(data)) or 1
+            else:
+                frames = getattr(img, "n_frames", 1)
+
+            return ImageInfo(img.format, img.width, img.height, frames)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return
+
+
+class Asset:
+    """Raw bytes of a downloaded image, its metadata is probed on first access"""
+
+    __slots__ = ("data", "_info", "_probed")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self._info: Optional[ImageInfo] = None
+        self._probed = False
+
+    @property
+    def info(self) -> Optional[ImageInfo]:
+        if not self._probed:
+            self._info = probe(self.data)
+            self._probed = True
+
+        return self._info
+
+
+class AssetBuffer(BytesIO):
+    """A buffer over a cached asset, BytesIO shares the bytes until it is written to"""
+
+    def __init__(self, asset: Asset) -> None:
+        super().__init__(asset.data)
+        self.asset = asset
+
+
+asset_cache = LRUCache(
+    "assets", ASSET_CACHE_SIZE, ttl=ASSET_TTL, sizeof=lambda asset: len(asset.data)
+)
+
+
+def asset_key(url: str, params: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """Returns the cache key of a Discord CDN url, other urls aren't cached.
+
+    The path of a CDN url contains the asset hash or the attachment id, so it
+    always points to the same content. Other hosts can change what a url returns.
+    """
+    parsed = urlparse(url)
+    if parsed.hostname not in DISCORD_CDN_HOSTS:
+        return
+
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parsed.query) + list((params or {}).items())
+        if name not in SIGNATURE_PARAMS
+    ]
+    return parsed.path + ("?" + urlencode(sorted(query)) if query else "")
+
+
+async def cached_read(
+    key: Optional[str], read: Callable[[], Awaitable[Optional[bytes]]]
+) -> Optional[AssetBuffer]:
+    """Returns the asset stored under the key, or reads and stores it.
+
+    Keys come from asset_key, without a key the asset is read but not stored.
+    """
+    asset = asset_cache.get(key) if key is not None else None
+    if asset is None:
+        data = await read()
+        if data is None:
+            return
+
+        asset = Asset(data)
+        if key is not None:
+            asset_cache[key] = asset
+
+    return AssetBuffer(asset)
+
+
+def get_info(buffer: BytesIO) -> Optional[ImageInfo]:
+    if isinstance(buffer, AssetBuffer):
+        return buffer.asset.info
+
+    return probe(buffer.getvalue())
+
+
+async def setup(bot):
+    pass
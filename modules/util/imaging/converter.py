@@ -1,14 +1,18 @@
+import asyncio
 import re
-from io import BytesIO
 from urllib.parse import urlparse
 
+import discord
 import emoji
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession
 from bs4 import BeautifulSoup
 from discord.ext import commands
 
 from modules.util.converters import SpecificUserConverter
 from modules.util.executor import executor
+from modules.util.fetch import InvalidContentType, ResponseTooLarge, fetch
+from modules.util.imaging.assets import asset_key, cached_read
+from modules.util.tracing import traced
 
 TENOR_REGEX = r"https?:\/\/tenor\.com\/view\/.+"
 URL_REGEX = (
@@ -16,10 +20,11 @@ URL_REGEX = (
 )
 
 CONTENT_TYPES = ["image/gif", "image/jpeg", "image/png", "image/webp"]
+SIZE_LIMIT = 16 * 1024 * 1024  # 16 mb
 
 
 async def scrape_tenor(session: ClientSession, url: str):
-    @executor()
+    @executor("parse")
     def parse(content: str):
         soup = BeautifulSoup(content, "lxml")
         gif = soup.find("div", class_="Gif")
@@ -28,22 +33,38 @@ async def scrape_tenor(session: ClientSession, url: str):
             if img:
                 return img.get("src")
 
-    async with session.get(url) as resp:
-        if resp.status != 200:
+    try:
+        result = await fetch(
+            session, url, limit=2 * 1024 * 1024, content_types=["text/html"]
+        )
+    except (ClientError, asyncio.TimeoutError, InvalidContentType, ResponseTooLarge):
+        return
+
+    return await parse(result.data.decode(errors="replace"))
+
+
+async def read_url(url: str, session: ClientSession, **kwargs):
+    async def read():
+        try:
+            result = await fetch(
+                session, url, limit=SIZE_LIMIT, content_types=CONTENT_TYPES, **kwargs
+            )
+        except (
+            ClientError,
+            asyncio.TimeoutError,
+            InvalidContentType,
+            ResponseTooLarge,
+        ):
             return
 
-        content = await resp.text()
-        return await parse(content)
+        return result.data
 
+    return await cached_read(asset_key(url, kwargs.get("params")), read)
 
-async def read_url(url: str, session: ClientSession, *args, **kwargs):
-    resp = await session.get(url, *args, **kwargs)
-    content_type = resp.headers.get("Content-Type")
-    data = await resp.read()
-    if len(data) > 16 * 1024 * 1024:  # 16 mb
-        return
-    if content_type in CONTENT_TYPES:
-        return BytesIO(data)
+
+async def read_asset(asset: discord.Asset | discord.PartialEmoji):
+    """Reads a Discord asset, assets are keyed by their URL which contains their hash"""
+    return await cached_read(asset_key(asset.url), asset.read)
 
 
 async def parse_url(url: str, session: ClientSession):
@@ -54,6 +75,7 @@ async def parse_url(url: str, session: ClientSession):
 
 
 class ImageConverter(commands.Converter):
+    @traced("convert_image")
     async def convert(
         self,
         ctx: commands.Context,
@@ -90,8 +112,8 @@ class ImageConverter(commands.Converter):
             pass
         else:
             if not animated:
-                return BytesIO(await user.avatar.with_format("png").read()), True
-            return BytesIO(await user.avatar.read()), True
+                return await read_asset(user.avatar.with_format("png")), True
+            return await read_asset(user.avatar), True
 
         if re.match(URL_REGEX, argument):
             parsed_url = urlparse(argument)
@@ -108,7 +130,7 @@ class ImageConverter(commands.Converter):
         except Exception:
             pass
         else:
-            return BytesIO(await emoji_.read()), True
+            return await read_asset(emoji_), True
 
         if allow_emojis and emoji.is_emoji(argument):
             url = "https://emojicdn.elk.sh/" + argument
@@ -119,8 +141,8 @@ class ImageConverter(commands.Converter):
 
         if fallback:
             if not animated:
-                return BytesIO(await ctx.author.avatar.with_format("png").read()), False
-            return BytesIO(await ctx.author.avatar.read()), False
+                return await read_asset(ctx.author.avatar.with_format("png")), False
+            return await read_asset(ctx.author.avatar), False
         return None, False
 
 
@@ -0,0 +1,195 @@
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO, List, Optional
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+
+@dataclass(frozen=True)
+class EncodeInfo:
+    format: str
+    took: float  # seconds
+    size: int  # bytes
+
+
+def _quantize(frame: Image.Image) -> Image.Image:
+    """Converts a frame to an adaptive palette image, keeping full transparency"""
+    if frame.mode in ("P", "L"):
+        return frame.copy()
+
+    if frame.mode not in ("RGB", "RGBA"):
+        frame = frame.convert("RGBA")
+
+    quantized = frame.convert("P", palette=Image.Palette.ADAPTIVE)
+    if quantized.palette.mode == "RGBA":
+        for rgba, index in quantized.palette.colors.items():
+            if rgba[3] == 0:
+                quantized.info["transparency"] = index
+                break
+
+    return quantized
+
+
+def has_transparency(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+
+class GifEncoder:
+    """Writes GIF frames to a file object as they are added.
+
+    Pillow's save_all keeps every frame in memory until the whole animation is
+    written, this encodes each frame with its own local color table right away
+    so the frames can be composited into a single reused canvas.
+
+    With optimize the first frame's palette is reused for every frame and only
+    the region that changed since the previous frame is written. This only
+    works for opaque frames, transparent pixels would show the previous frame.
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        *,
+        loop: int = 0,
+        disposal: int = 2,
+        comment: Optional[str] = None,
+        optimize: bool = False,
+    ) -> None:
+        self.fp = fp
+        self.loop = loop
+        self.disposal = disposal
+        self.comment = comment
+        self.optimize = optimize
+        self.frames = 0
+        self.durations: List[int] = []
+        self.took = 0.0  # seconds spent encoding
+
+        self._palette: Optional[Image.Image] = None
+        self._previous: Optional[Image.Image] = None
+
+    def _write_header(self, quantized: Image.Image, duration: int) -> None:
+        info = {"duration": duration, "loop": self.loop}
+        if self.comment:
+            info["comment"] = self.comment
+
+        header, _ = GifImagePlugin.getheader(quantized, info=info)
+        for block in header:
+            self.fp.write(block)
+
+    def _add_optimized(self, frame: Image.Image, duration: int) -> None:
+        rgb = frame.convert("RGB")
+        if self._palette is None:
+            quantized = rgb.quantize(255, method=Image.Quantize.FASTOCTREE)
+            self._palette = quantized
+        else:
+            quantized = rgb.quantize(palette=self._palette, dither=Image.Dither.NONE)
+        rgb.close()
+
+        offset = (0, 0)
+        region = quantized
+        if self._previous is None:
+            self._write_header(quantized, duration)
+        else:
+            # unchanged frames still need a pixel to carry their duration
+            bbox = ImageChops.difference(self._previous, quantized).getbbox()
+            bbox = bbox or (0, 0, 1, 1)
+            offset = bbox[:2]
+            region = quantized.crop(bbox)
+
+        for block in GifImagePlugin.getdata(
+            region, offset=offset, duration=duration, disposal=1
+        ):
+            self.fp.write(block)
+
+        if self._previous is not None and self._previous is not self._palette:
+            self._previous.close()
+        self._previous = quantized
+
+    def _add_full(self, frame: Image.Image, duration: int) -> None:
+        quantized = _quantize(frame)
+
+        # also normalizes the palette of the frame, the header is only written once
+        if self.frames == 0:
+            self._write_header(quantized, duration)
+        else:
+            GifImagePlugin.getheader(quantized)
+
+        params = {
+            "duration": duration,
+            "disposal": self.disposal,
+            "include_color_table": True,
+        }
+        if "transparency" in quantized.info:
+            params["transparency"] = quantized.info["transparency"]
+
+        for block in GifImagePlugin.getdata(quantized, **params):
+            self.fp.write(block)
+
+        quantized.close()
+
+    def add_frame(self, frame: Image.Image, duration: int = 0) -> None:
+        start = time.perf_counter()
+        if self.optimize:
+            self._add_optimized(frame, duration)
+        else:
+            self._add_full(frame, duration)
+
+        self.durations.append(duration)
+        self.frames += 1
+        self.took += time.perf_counter() - start
+
+    def close(self) -> None:
+        self.fp.write(b";")  # trailer
+
+    def __enter__(self) -> "GifEncoder":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+
+
+def to_webp(gif: BytesIO, durations: List[int], quality: int = 75) -> BytesIO:
+    """Transcodes a GIF to animated WebP, frames are read from the GIF one at a time"""
+    buffer = BytesIO()
+    with Image.open(gif) as img:
+        img.save(
+            buffer,
+            format="webp",
+            save_all=True,
+            duration=durations,
+            loop=0,
+            quality=quality,
+            method=0,  # fastest, the transcode already decodes every frame again
+        )
+
+    buffer.seek(0)
+    return buffer
+
+
+def choose_smallest(
+    gif: BytesIO, encoder: GifEncoder, size_target: Optional[int]
+) -> tuple[BytesIO, EncodeInfo]:
+    """Returns the encoded GIF, or a WebP of it if the GIF exceeds the size target.
+
+    The WebP is only used when it is smaller than the GIF.
+    """
+    start = time.perf_counter()
+    best, fmt = gif, "gif"
+    size = len(gif.getbuffer())
+
+    if size_target is not None and size > size_target and encoder.frames > 1:
+        gif.seek(0)
+        webp = to_webp(gif, encoder.durations)
+        webp_size = len(webp.getbuffer())
+        if webp_size < size:
+            best, fmt, size = webp, "webp", webp_size
+
+    best.seek(0)
+    took = encoder.took + time.perf_counter() - start
+    return best, EncodeInfo(fmt, took, size)
+
+
+async def setup(bot):
+    pass
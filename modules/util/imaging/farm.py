@@ -0,0 +1,51 @@
+import os
+from io import BytesIO
+from typing import Callable
+
+import config
+from modules.util.process import ResourceLimits
+from modules.util.workers import WorkerPool, get_worker_pool
+
+RENDER_LIMITS = ResourceLimits(memory=2 * 1024 * 1024 * 1024)  # 2 gb per worker
+
+_config = getattr(config, "render", None)  # configs from before the render section
+
+
+def _warm_worker() -> None:
+    # importing the renderer loads the fonts into the worker's FontDB once
+    import modules.util.imaging.renderer  # noqa: F401
+
+
+def _run_render(name: str, args: tuple, kwargs: dict) -> tuple:
+    from modules.util.imaging.renderer import Renders
+
+    args = [arg.getvalue() if isinstance(arg, BytesIO) else arg for arg in args]
+    buffer, *info = getattr(Renders, name)(*args, **kwargs)
+    return buffer.getvalue(), *info
+
+
+render_pool = WorkerPool(
+    "render",
+    getattr(_config, "processes", 0) or os.cpu_count() or 1,
+    initializer=_warm_worker,
+    limits=RENDER_LIMITS,
+    timeout=getattr(_config, "timeout", 60),
+)
+
+
+async def run_render(render: Callable, *args, **kwargs) -> tuple:
+    """Runs one of the synchronous Renders in the render pool.
+
+    Returns the same tuple as the render, with the buffer recreated from its bytes.
+    """
+    pool = get_worker_pool("render")  # the render_pool of this module after reloads
+    data, *info = await pool.submit(_run_render, render.__name__, args, kwargs)
+    return BytesIO(data), *info
+
+
+async def setup(bot):
+    bot.render_pool = render_pool
+
+
+async def teardown(bot):
+    render_pool.close()
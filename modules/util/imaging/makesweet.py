@@ -0,0 +1,240 @@
+import asyncio
+import json
+import math
+import os
+from typing import List, Optional, Set
+
+import config
+from PIL import Image, ImageOps
+
+from modules.util.executor import executor
+from modules.util.process import ProcessTimeout, ResourceLimits, run
+
+IMAGE = "jottew/makesweet"
+TEMPLATES_PATH = os.path.join(os.getcwd(), "assets/makesweet_templates")
+JOBS_PATH = os.path.join(os.getcwd(), "cache/makesweet")  # mounted into the containers
+MAKESWEET_TIMEOUT = 60
+MAKESWEET_LIMITS = ResourceLimits(nice=10, memory=2 * 1024 * 1024 * 1024)
+CONTAINER_LABEL = "amyrin.makesweet"  # its value is the prefix of the containers
+
+
+class DockerMakesweet:
+    """Runs makesweet in long-lived containers, jobs are sent to them with docker exec.
+
+    Every container handles one job at a time, so the amount of containers bounds
+    the amount of concurrent renders. A container whose job times out is removed
+    and started again on its next job. Containers are named and labelled by the
+    prefix, so the ones left behind by a crash are removed on the next start.
+    """
+
+    def __init__(self, workers: int, prefix: str) -> None:
+        self.workers = workers
+        self.prefix = prefix
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._running: Set[str] = set()
+        self._entrypoint: Optional[List[str]] = None
+
+    async def _get_entrypoint(self) -> List[str]:
+        if self._entrypoint is None:
+            result = await run(
+                "docker",
+                "image",
+                "inspect",
+                "--format",
+                "{{json .Config.Entrypoint}}",
+                IMAGE,
+                timeout=30,
+            )
+            try:
+                self._entrypoint = json.loads(result.stdout) or ["makesweet"]
+            except json.JSONDecodeError:
+                self._entrypoint = ["makesweet"]
+
+        return self._entrypoint
+
+    async def start(self) -> None:
+        try:
+            result = await run(
+                "docker",
+                "ps",
+                "--all",
+                "--quiet",
+                "--filter",
+                f"label={CONTAINER_LABEL}={self.prefix}",
+                timeout=30,
+            )
+        except FileNotFoundError:  # no docker on this host, renders will say so
+            return
+
+        stale = result.stdout.decode().split()
+        if stale:
+            await run("docker", "rm", "--force", *stale, timeout=60)
+
+    async def _start(self, name: str) -> None:
+        await run("docker", "rm", "--force", name, timeout=30)
+        await run(
+            "docker",
+            "run",
+            "--detach",
+            "--rm",
+            "--name",
+            name,
+            "--label",
+            f"{CONTAINER_LABEL}={self.prefix}",
+            "--volume",
+            f"{TEMPLATES_PATH}:/share/templates:ro",
+            "--volume",
+            f"{JOBS_PATH}:/share/jobs",
+            "--workdir",
+            "/share",
+            "--entrypoint",
+            "sleep",
+            IMAGE,
+            "infinity",
+            timeout=120,
+            check=True,
+        )
+        self._running.add(name)
+
+    async def _remove(self, name: str) -> None:
+        self._running.discard(name)
+        await run("docker", "rm", "--force", name, timeout=30)
+
+    async def render(
+        self, template: str, inputs: List[str], output: str, timeout: float
+    ) -> None:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for index in range(self.workers):
+                self._idle.put_nowait(f"{self.prefix}-{index}")
+
+        name = await self._idle.get()
+        try:
+            if name not in self._running:
+                await self._start(name)
+
+            def container_path(path: str) -> str:
+                return "jobs/" + os.path.relpath(path, JOBS_PATH)
+
+            await run(
+                "docker",
+                "exec",
+                name,
+                *await self._get_entrypoint(),
+                "--zip",
+                f"templates/{template}.zip",
+                "--in",
+                *map(container_path, inputs),
+                "--gif",
+                container_path(output),
+                timeout=timeout,
+                check=True,
+            )
+        except (ProcessTimeout, asyncio.CancelledError):
+            # killing the docker client doesn't stop the process in the container
+            await asyncio.shield(self._remove(name))
+            raise
+        finally:
+            self._idle.put_nowait(name)
+
+    async def close(self) -> None:
+        for name in list(self._running):
+            await self._remove(name)
+
+
+class LocalMakesweet:
+    """Runs a makesweet binary installed on the host"""
+
+    def __init__(self, workers: int, binary: str) -> None:
+        self.binary = binary
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def start(self) -> None:
+        pass
+
+    async def render(
+        self, template: str, inputs: List[str], output: str, timeout: float
+    ) -> None:
+        async with self._semaphore:
+            await run(
+                self.binary,
+                "--zip",
+                os.path.join(TEMPLATES_PATH, f"{template}.zip"),
+                "--in",
+                *inputs,
+                "--gif",
+                output,
+                timeout=timeout,
+                limits=MAKESWEET_LIMITS,
+                check=True,
+            )
+
+    async def close(self) -> None:
+        pass
+
+
+@executor("render")
+def _stand_in_render(inputs: List[str], output: str, frames: int = 12) -> None:
+    images = [Image.open(path).convert("RGB") for path in inputs]
+    size = (256, 256)
+    sources = [ImageOps.fit(image, size) for image in images]
+
+    rendered = []
+    for index in range(frames):
+        angle = math.sin(index / frames * 2 * math.pi) * 10
+        frame = Image.new("RGB", (size[0] * len(sources), size[1]), "white")
+        for offset, source in enumerate(sources):
+            rotated = source.rotate(angle, fillcolor="white")
+            frame.paste(rotated, (offset * size[0], 0))
+        rendered.append(frame)
+
+    rendered[0].save(
+        output, "gif", save_all=True, append_images=rendered[1:], duration=80, loop=0
+    )
+
+    for image in images:
+        image.close()
+
+
+class StandInMakesweet:
+    """Renders a wobbling animation with Pillow, for tests and hosts without docker"""
+
+    def __init__(self, workers: int) -> None:
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def start(self) -> None:
+        pass
+
+    async def render(
+        self, template: str, inputs: List[str], output: str, timeout: float
+    ) -> None:
+        async with self._semaphore:
+            await asyncio.wait_for(_stand_in_render(inputs, output), timeout)
+
+    async def close(self) -> None:
+        pass
+
+
+def create_makesweet():
+    _config = getattr(config, "render", None)  # configs from before the render section
+    backend = getattr(_config, "makesweet_backend", "docker")
+    workers = getattr(_config, "makesweet_workers", 2)
+
+    if backend == "local":
+        return LocalMakesweet(workers, getattr(_config, "makesweet_binary", "makesweet"))
+    if backend == "stand-in":
+        return StandInMakesweet(workers)
+
+    return DockerMakesweet(workers, getattr(_config, "makesweet_prefix", "makesweet"))
+
+
+makesweet_pool = create_makesweet()
+
+
+async def setup(bot):
+    await makesweet_pool.start()
+
+
+async def teardown(bot):
+    await makesweet_pool.close()
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import config
+from modules.util.executor import executor
+from modules.util.metrics import metrics
+
+
+def make_key(*parts) -> str:
+    """Hashes the normalized render inputs, images are hashed by their content"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, BytesIO):
+            part = part.getvalue()
+
+        if isinstance(part, bytes):
+            data = b"b" + part
+        else:
+            data = b"r" + repr(part).encode()
+
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+
+    return digest.hexdigest()
+
+
+@executor("io")
+def _read_file(path: os.PathLike) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+
+    os.utime(path)  # the mtime doubles as the last access time
+    return data
+
+
+@executor("io")
+def _write_file(path: os.PathLike, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@executor("io")
+def _remove_files(paths: List[os.PathLike]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@executor("io")
+def _scan(path: os.PathLike) -> Dict[str, Tuple[int, float]]:
+    os.makedirs(path, exist_ok=True)
+
+    files = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime)
+
+    return files
+
+
+class RenderCache:
+    """Content addressed cache for render outputs.
+
+    Recently used outputs are kept in memory, everything else on disk.
+    Both tiers have a byte budget and evict the least recently used outputs.
+    Concurrent lookups of the same key share a single disk read.
+    """
+
+    def __init__(self, path: os.PathLike, memory_budget: int, disk_budget: int):
+        self.path = path
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+        self._memory: OrderedDict[str, Tuple[bytes, bool]] = OrderedDict()
+        self._memory_size = 0
+        self._disk: Optional[OrderedDict[str, int]] = None  # file name -> size
+        self._disk_size = 0
+        self._scanning: Optional[asyncio.Future] = None
+        self._loading: Dict[str, asyncio.Future] = {}  # key -> disk lookup in flight
+
+    @staticmethod
+    def _filename(key: str, is_animated: bool) -> str:
+        return f"{key}-{int(is_animated)}"
+
+    async def _scan_disk(self) -> None:
+        files = await _scan(self.path)
+        self._disk = OrderedDict(
+            (name, size)
+            for name, (size, _) in sorted(files.items(), key=lambda x: x[1][1])
+        )
+        self._disk_size = sum(self._disk.values())
+
+    async def _load_disk(self) -> OrderedDict:
+        if self._disk is None:
+            if self._scanning is None:
+                self._scanning = asyncio.ensure_future(self._scan_disk())
+            try:
+                await asyncio.shield(self._scanning)
+            except Exception:
+                self._scanning = None  # the next lookup scans again
+                raise
+
+        return self._disk
+
+    def _put_memory(self, key: str, data: bytes, is_animated: bool) -> None:
+        if len(data) > self.memory_budget:
+            return
+
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key)[0])
+
+        self._memory[key] = (data, is_animated)
+        self._memory_size += len(data)
+
+        while self._memory_size > self.memory_budget:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            metrics.counter("render_cache_evictions_total", tier="memory").inc()
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, bool]]:
+        if (cached := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            metrics.counter("render_cache_total", result="memory_hit").inc()
+            return cached
+
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = asyncio.ensure_future(self._get_disk(key))
+            self._loading[key] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(key, None))
+
+        # one waiter getting cancelled doesn't cancel the read the others wait for
+        return await asyncio.shield(loading)
+
+    async def _get_disk(self, key: str) -> Optional[Tuple[bytes, bool]]:
+        disk = await self._load_disk()
+        for is_animated in (True, False):
+            name = self._filename(key, is_animated)
+            if name not in disk:
+                continue
+
+            data = await _read_file(os.path.join(self.path, name))
+            if data is None:  # removed behind our back
+                self._disk_size -= disk.pop(name, 0)
+                break
+
+            if name in disk:  # a put may have evicted it during the read
+                disk.move_to_end(name)
+            self._put_memory(key, data, is_animated)
+            metrics.counter("render_cache_total", result="disk_hit").inc()
+            return data, is_animated
+
+        metrics.counter("render_cache_total", result="miss").inc()
+
+    async def put(self, key: str, data: bytes, is_animated: bool) -> None:
+        self._put_memory(key, data, is_animated)
+
+        if len(data) > self.disk_budget:
+            return
+
+        disk = await self._load_disk()
+        name = self._filename(key, is_animated)
+        await _write_file(os.path.join(self.path, name), data)
+
+        self._disk_size += len(data) - disk.pop(name, 0)
+        disk[name] = len(data)
+
+        evicted = []
+        while self._disk_size > self.disk_budget:
+            name, size = disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(os.path.join(self.path, name))
+            metrics.counter("render_cache_evictions_total", tier="disk").inc()
+
+        if evicted:
+            await _remove_files(evicted)
+
+        metrics.gauge("render_cache_bytes", tier="memory").set(self._memory_size)
+        metrics.gauge("render_cache_bytes", tier="disk").set(self._disk_size)
+
+
+_config = getattr(config, "render", None)  # configs from before the render section
+
+render_cache = RenderCache(
+    os.path.join(os.getcwd(), getattr(_config, "cache_path", "cache/renders")),
+    getattr(_config, "cache_memory", 64 * 1024 * 1024),
+    getattr(_config, "cache_disk", 1024 * 1024 * 1024),
+)
+
+
+async def setup(bot):
+    pass
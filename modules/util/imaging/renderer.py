@@ -4,17 +4,23 @@ import os
 import tempfile
 from dataclasses import dataclass
 from io import BytesIO
-from typing import Callable, List, Literal, Union
+from typing import Callable, List, Literal, Optional, Union
 
-from imagetext_py import (EmojiOptions, FontDB, Paint, TextAlign, WrapStyle,
-                          Writer, text_size_multiline, text_wrap)
+from imagetext_py import EmojiOptions, FontDB, Paint, TextAlign, Writer
 from PIL import Image, ImageSequence
 
-from modules.util.executor import run_blocking_func
+from modules.util.imaging.assets import scan_gif
+from modules.util.imaging.encoder import (EncodeInfo, GifEncoder,
+                                          choose_smallest, has_transparency)
 from modules.util.imaging.exceptions import (CharacterLimitExceeded,
                                              InvalidTemplate, TooManyFrames)
+from modules.util.imaging.farm import run_render
+from modules.util.imaging.makesweet import (JOBS_PATH, MAKESWEET_TIMEOUT,
+                                            TEMPLATES_PATH, makesweet_pool)
+from modules.util.imaging.render_cache import make_key, render_cache
+from modules.util.imaging.text import caption_band, fit_text, wrap_text
 from modules.util.imaging.utils import SequentialImageProcessor
-from modules.util.media.base import execute
+from modules.util.metrics import metrics
 from modules.util.timer import Timer
 
 font_path = os.path.join(os.getcwd(), "assets/fonts")
@@ -27,6 +33,17 @@ class RenderResult:
     buffer: BytesIO
     took: int
     is_animated: bool
+    cached: bool = False
+    encoding: Optional[EncodeInfo] = None
+
+    @property
+    def extension(self) -> str:
+        header = self.buffer.getvalue()[:12]
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return "webp"
+        if header[:3] == b"GIF":
+            return "gif"
+        return "png"
 
 
 class Renders:
@@ -43,43 +60,14 @@ class Renders:
         if text_length > text_limit:
             raise CharacterLimitExceeded(len(text), text_limit)
 
-        font = FontDB.Query("arial-unicode-ms arabic")
+        font = "arial-unicode-ms arabic"
 
         width, height = size
         img_width = width * img_width
 
-        # literally have no idea how binary search works so thank you very much mr chatgpt!!!
-
-        while t_size_min < t_size_max:
-            t_size = (t_size_min + t_size_max) // 2
-            wrapped_text = text_wrap(
-                text,
-                math.floor(img_width),
-                t_size,
-                font,
-                wrap_style=WrapStyle.Character,
-                draw_emojis=True,
-            )
-            _, t_height = text_size_multiline(
-                wrapped_text, t_size, font, draw_emojis=True
-            )
-
-            if t_height > height:
-                t_size_max = t_size - 1
-            else:
-                t_size_min = t_size + 1
-
-        # t_size_min will now be the optimal font size
-        t_size = t_size_min
-        wrapped_text = text_wrap(
-            text,
-            math.floor(img_width),
-            t_size,
-            font,
-            wrap_style=WrapStyle.Character,
-            draw_emojis=True,
+        wrapped_text, t_size = fit_text(
+            text, font, math.floor(img_width), height, t_size_min, t_size_max
         )
-        _, t_height = text_size_multiline(wrapped_text, t_size, font, draw_emojis=True)
 
         buf = BytesIO()
         with Image.new("RGBA", size, "white") as img:
@@ -92,7 +80,7 @@ class Renders:
                     ay=0.5,
                     width=img_width,
                     size=t_size,
-                    font=font,
+                    font=FontDB.Query(font),
                     fill=Paint.Color((0, 0, 0, 255)),
                     align=TextAlign.Center,
                     draw_emojis=True,
@@ -108,63 +96,46 @@ class Renders:
         size: tuple[int, int] = (512, 512),
         *images: List[Union[bytes, BytesIO, str]],
     ) -> BytesIO:
-        command = ["docker", "run"]
-
-        cwd = os.getcwd()
-        templates_path = os.path.join(cwd, "assets/makesweet_templates")
-        template_path = os.path.join(templates_path, f"{template}.zip")
-
+        template_path = os.path.join(TEMPLATES_PATH, f"{template}.zip")
         if not os.path.isfile(template_path):
             raise InvalidTemplate(template)
 
-        command.extend(["-v", f"{templates_path}:/share/templates"])
-
-        td = tempfile.TemporaryDirectory()
-        command.extend(["-v", f"{td.name}:/share"])
-
-        command.extend(["jottew/makesweet"])
-        command.extend(["--zip", f"templates/{template}.zip"])
-        command.append("--in")
-
-        for index, image in enumerate(images):
-            if isinstance(image, str):
-                image, _ = await run_blocking_func(
-                    Renders.centered_text, image, size=size, img_width=0.85
-                )
-
-            processor = SequentialImageProcessor(image)
-            await processor._init()
-            await processor.change_format("jpeg")
-            await processor.crop_to_center()
-            image = await processor.save()
-
-            if hasattr(image, "read"):
-                image = image.read()
-
-            image_name = f"image{index}.png"
-            image_path = os.path.join(td.name, image_name)
-            docker_image_path = os.path.join("/share", image_name)
-            with open(image_path, "wb") as f:
-                f.write(image)
+        os.makedirs(JOBS_PATH, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=JOBS_PATH) as td:
+            inputs = []
+            for index, image in enumerate(images):
+                if isinstance(image, str):
+                    image, _ = await run_render(
+                        Renders.centered_text, image, size=size, img_width=0.85
+                    )
 
-            command.append(docker_image_path)
+                processor = SequentialImageProcessor(image)
+                image = await processor.change_format("jpeg").crop_to_center().save()
 
-        command.extend(["--gif", "output.gif"])
+                if hasattr(image, "read"):
+                    image = image.read()
 
-        command_string = " ".join(command)
+                image_path = os.path.join(td, f"image{index}.png")
+                with open(image_path, "wb") as f:
+                    f.write(image)
 
-        await execute(command_string)
+                inputs.append(image_path)
 
-        output_path = os.path.join(td.name, "output.gif")
-        with open(output_path, "rb") as f:
-            data = BytesIO(f.read())
+            output_path = os.path.join(td, "output.gif")
+            await makesweet_pool.render(
+                template, inputs, output_path, timeout=MAKESWEET_TIMEOUT
+            )
 
-        td.cleanup()
+            with open(output_path, "rb") as f:
+                data = BytesIO(f.read())
 
         return data, True
 
     def caption(
-        image: bytes | BytesIO, text: str, bypass_charlimit: bool = False
+        image: bytes | BytesIO,
+        text: str,
+        bypass_charlimit: bool = False,
+        size_target: Optional[int] = None,
     ) -> BytesIO:
         """probably will reimplement in rust once ive learned it"""
         if isinstance(image, bytes):
@@ -172,40 +143,50 @@ class Renders:
 
         gif_char_limit = 1000
         char_limit = 2000
-        frame_limit = 500
+        frame_limit = 500  # frames rendered, longer gifs get sampled down to this
+        max_frames = 5000  # gifs beyond this are refused
         text_length = len(text)
 
         if text_length > char_limit and not bypass_charlimit:
             raise CharacterLimitExceeded(text_length, char_limit)
 
-        font = FontDB.Query("futura-condensed-extra-bold arabic")
+        font = "futura-condensed-extra-bold arabic"
+
+        # gifs are counted from their block structure before anything is decoded
+        durations = None
+        data = image.getvalue()
+        if data[:3] == b"GIF":
+            durations = scan_gif(data, limit=max_frames)
+            if len(durations) > max_frames:
+                raise TooManyFrames(len(durations), max_frames)
 
         with Image.open(image) as img:
-            if hasattr(img, "n_frames"):
-                if img.n_frames > frame_limit:
-                    raise TooManyFrames(img.n_frames, frame_limit)
+            if durations:
+                n_frames = len(durations)
+            else:
+                n_frames = getattr(img, "n_frames", 1)
+                if n_frames > frame_limit:
+                    raise TooManyFrames(n_frames, frame_limit)
+
+            # every step-th frame is kept and shown for the dropped frames' time too
+            step = math.ceil(n_frames / frame_limit)
+            if step > 1:
+                metrics.counter("caption_frames_dropped_total").inc(
+                    n_frames - math.ceil(n_frames / step)
+                )
+
+            if n_frames > 1 and text_length > gif_char_limit and not bypass_charlimit:
+                raise CharacterLimitExceeded(text_length, gif_char_limit)
 
             aspect_ratio = img.height / img.width
             size = (1024, int(1024 * aspect_ratio))
 
-            processed = []
-            durations = []
-
             width, height = size
             c_width = width * 0.85  # subjective design choice for borders
             t_size = 130
 
-            wrapped_text = text_wrap(
-                text,
-                math.floor(c_width),
-                t_size,
-                font,
-                wrap_style=WrapStyle.Character,  # can change to make faster, just wont seperately wrap characters
-                draw_emojis=True,
-            )
-            _, t_height = text_size_multiline(
-                wrapped_text, t_size, font, draw_emojis=True
-            )
+            # wrapping and measuring are cached, repeated captions skip all text shaping
+            _, t_height = wrap_text(text, font, math.floor(c_width), t_size)
             c_height = int(
                 t_height * 1.15
             )  # objectively looks better /j (just adds borders)
@@ -220,74 +201,70 @@ class Renders:
             )  # combines height of the original image and the caption image height
             caption_size = (width, c_height)
 
-            with Image.new("RGBA", caption_size, "white") as caption:
-                with Writer(caption) as writer:
-                    writer.draw_text_multiline(
-                        text=wrapped_text,
-                        x=width / 2,
-                        y=c_height / 2,  # get the center of the caption image
-                        ax=0.5,
-                        ay=0.5,  # define anchor points (middle)
-                        width=c_width,
-                        size=t_size,
-                        font=font,
-                        fill=Paint.Color((0, 0, 0, 255)),
-                        align=TextAlign.Center,
-                        draw_emojis=True,
-                    )
+            caption = caption_band(text, font, caption_size, t_size, c_width)
+
+            buffer = BytesIO()
+
+            # frames are composited into one canvas and encoded one by one,
+            # so memory stays flat regardless of the amount of frames
+            with Image.new(
+                "RGBA", full_img_size, (255, 255, 255, 0)
+            ) as full_img, GifEncoder(
+                buffer, comment="im gay", optimize=not has_transparency(img)
+            ) as encoder:
+                full_img.paste(caption, (0, 0))
 
-                for frame in ImageSequence.Iterator(img):
-                    if text_length > gif_char_limit and not bypass_charlimit:
-                        break
+                for index, frame in enumerate(ImageSequence.Iterator(img)):
+                    if index % step:
+                        continue
+
+                    if durations:
+                        duration = sum(
+                            5 if delay is None else delay
+                            for delay in durations[index : index + step]
+                        )
+                    else:
+                        duration = frame.info.get("duration", 5)
 
-                    durations.append(frame.info.get("duration", 5))
                     if frame.size != size:
                         frame = frame.resize(size, resample=Image.LANCZOS)
-                    with Image.new(
-                        "RGBA", full_img_size, (255, 255, 255, 0)
-                    ) as full_img:
-                        full_img.paste(caption, (0, 0))
-                        full_img.paste(frame, (0, c_height))
-
-                        processed.append(full_img)
-
-                caption.close()
-
-                buffer = BytesIO()
-                processed[0].save(
-                    buffer,
-                    format="gif",
-                    save_all=True,
-                    append_images=[] if len(processed) == 1 else processed[1:],
-                    duration=durations,
-                    loop=0,
-                    disposal=2,
-                    comment="im gay",
-                )
-                buffer.seek(0)
 
-                is_animated = len(processed) > 1
+                    full_img.paste(frame, (0, c_height))
+                    encoder.add_frame(full_img, duration)
 
-                for frame in processed:
-                    frame.close()
-
-                del processed
-                img.close()
-                return buffer, is_animated
+            # switches to webp when the gif is too large to upload
+            output, encoding = choose_smallest(buffer, encoder, size_target)
+            return output, encoder.frames > 1, encoding
 
 
 async def render(render: Callable, *args, **kwargs):
+    """Runs a render, synchronous renders are sent to the render worker processes"""
     with Timer() as timer:
         if not inspect.iscoroutinefunction(render):
-            result = await run_blocking_func(render, *args, **kwargs)
-            if inspect.iscoroutine(result):
-                result = await result
+            result = await run_render(render, *args, **kwargs)
         else:
             result = await render(*args, **kwargs)
 
-    buffer, is_animated = result
+    buffer, is_animated, *encoding = result
+
+    return RenderResult(
+        buffer, timer.time * 1000, is_animated, encoding=next(iter(encoding), None)
+    )
+
+
+async def cached_render(func: Callable, *args, **kwargs):
+    """Like render, but serves outputs of previously rendered inputs from the render cache"""
+    with Timer() as timer:
+        key = make_key(func.__name__, *args, *sorted(kwargs.items()))
+        cached = await render_cache.get(key)
+
+    if cached is not None:
+        data, is_animated = cached
+        return RenderResult(BytesIO(data), timer.time * 1000, is_animated, True)
 
-    return RenderResult(buffer, timer.time * 1000, is_animated)
+    result = await render(func, *args, **kwargs)
+    await render_cache.put(key, result.buffer.getvalue(), result.is_animated)
+    return result
 
 
 async def setup(bot):
@@ -0,0 +1,174 @@
+import math
+from typing import List, Tuple
+
+from imagetext_py import (FontDB, Paint, TextAlign, WrapStyle, Writer,
+                          text_size_multiline, text_wrap)
+from PIL import Image
+
+from modules.util.cache import LRUCache
+
+# caches are per process, every render worker keeps its own
+layout_cache = LRUCache("text_layout", maxsize=4096)
+band_cache = LRUCache("caption_band", maxsize=32)  # ~4 mb per 1024px band
+metrics_cache = LRUCache("text_metrics", maxsize=1024)
+
+REFERENCE_SIZE = 100  # font size the text is measured at for fitting
+
+
+def wrap_text(text: str, font: str, width: int, size: int) -> Tuple[List[str], int]:
+    """Wraps the text to the width and returns the lines and their total height"""
+    key = (text, font, width, size)
+    layout = layout_cache.get(key)
+    if layout is None:
+        query = FontDB.Query(font)
+        wrapped = text_wrap(
+            text,
+            width,
+            size,
+            query,
+            wrap_style=WrapStyle.Character,
+            draw_emojis=True,
+        )
+        _, height = text_size_multiline(wrapped, size, query, draw_emojis=True)
+        layout = (wrapped, height)
+        layout_cache[key] = layout
+
+    return layout
+
+
+def measure_text(
+    text: str, font: str
+) -> Tuple[List[Tuple[float, float, float]], float]:
+    """Measures each paragraph at the reference size, and the line height.
+
+    Paragraphs are measured as their advance, average word advance and average
+    glyph advance. Advances and line heights scale linearly with the font size,
+    so this is enough to predict the layout at any size.
+    """
+    key = (text, font)
+    measured = metrics_cache.get(key)
+    if measured is None:
+        query = FontDB.Query(font)
+        paragraphs = []
+        line_height = 0
+        for paragraph in text.split("\n"):
+            advance, height = text_size_multiline(
+                [paragraph], REFERENCE_SIZE, query, draw_emojis=True
+            )
+            word = advance / max(1, len(paragraph.split()))
+            glyph = advance / max(1, len(paragraph))
+            paragraphs.append((advance, word, glyph))
+            line_height = max(line_height, height)
+
+        measured = (paragraphs, line_height)
+        metrics_cache[key] = measured
+
+    return measured
+
+
+def predict_height(
+    paragraphs: List[Tuple[float, float, float]],
+    line_height: float,
+    width: int,
+    size: int,
+) -> float:
+    scale = size / REFERENCE_SIZE
+    lines = 0
+    for advance, word, glyph in paragraphs:
+        # wrapping leaves about half a word unused per line, or half a glyph
+        # when words are broken up because they are wider than the line
+        unused = (word if word * scale < width else glyph) * scale / 2
+        lines += max(1, math.ceil(advance * scale / max(1, width - unused)))
+
+    return lines * line_height * scale
+
+
+def fit_text(
+    text: str, font: str, width: int, height: int, min_size: int, max_size: int
+) -> Tuple[List[str], int]:
+    """Returns the wrapped text and the largest size between the bounds that fits.
+
+    The size is predicted from the measured metrics and verified with one or two
+    real layouts, bisecting real layouts is only the fallback for bad predictions.
+    """
+    paragraphs, line_height = measure_text(text, font)
+
+    # the predicted height grows with the size, bisecting the model costs no layouts
+    low, high = min_size, max_size
+    while low < high:
+        size = (low + high + 1) // 2
+        if predict_height(paragraphs, line_height, width, size) <= height:
+            low = size
+        else:
+            high = size - 1
+
+    size = low
+    wrapped, t_height = wrap_text(text, font, width, size)
+    if t_height <= height:
+        # the wasted space is an estimate, one size larger can still fit
+        if size < max_size:
+            larger, t_height = wrap_text(text, font, width, size + 1)
+            if t_height <= height:
+                return larger, size + 1
+
+        return wrapped, size
+
+    if size <= min_size:
+        return wrapped, size
+
+    # the height grows with the square of the size, lines and line height both scale
+    high = size - 1
+    size = max(min_size, min(high, math.floor(size * math.sqrt(height / t_height))))
+    wrapped, t_height = wrap_text(text, font, width, size)
+    if t_height <= height or size <= min_size:
+        return wrapped, size
+
+    high = size - 1
+    low = min_size
+    while low < high:
+        size = (low + high + 1) // 2
+        _, t_height = wrap_text(text, font, width, size)
+        if t_height <= height:
+            low = size
+        else:
+            high = size - 1
+
+    wrapped, _ = wrap_text(text, font, width, low)
+    return wrapped, low
+
+
+def caption_band(
+    text: str, font: str, size: Tuple[int, int], t_size: int, text_width: float
+) -> Image.Image:
+    """Returns a white band with the centered text.
+
+    Bands are shared between calls, so they must not be modified or closed.
+    """
+    key = (text, font, size, t_size, text_width)
+    band = band_cache.get(key)
+    if band is None:
+        width, height = size
+        wrapped, _ = wrap_text(text, font, math.floor(text_width), t_size)
+
+        band = Image.new("RGBA", size, "white")
+        with Writer(band) as writer:
+            writer.draw_text_multiline(
+                text=wrapped,
+                x=width / 2,
+                y=height / 2,  # get the center of the caption image
+                ax=0.5,
+                ay=0.5,  # define anchor points (middle)
+                width=text_width,
+                size=t_size,
+                font=FontDB.Query(font),
+                fill=Paint.Color((0, 0, 0, 255)),
+                align=TextAlign.Center,
+                draw_emojis=True,
+            )
+        band_cache[key] = band
+
+    return band
+
+
+async def setup(bot):
+    pass
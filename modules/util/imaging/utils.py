@@ -1,12 +1,21 @@
 import functools
-from copy import copy
+import itertools
+import math
 from io import BytesIO
-from typing import List
+from typing import Callable, Iterable, List
 
+import numpy as np
 from PIL import Image
+from wand.image import BaseImage
 from wand.image import Image as WandImage
 
-from modules.util.executor import executor
+from modules.util.executor import executor, map_in_pool
+
+DOMINANT_COLORS_SIZE = 128  # pixels per side the frames are sampled down to
+DOMINANT_COLORS_FRAMES = 8  # maximum amount of frames sampled from animations
+DOMINANT_COLORS_CLUSTERS = 8  # amount of colors the pixels are grouped into
+DOMINANT_COLORS_ITERATIONS = 16  # maximum k-means iterations
+DOMINANT_COLORS_DISTANCE = 32  # groups closer than this are reported as one color
 
 
 class NotInitialized(Exception):
@@ -24,46 +33,42 @@ def check_initialized(func):
     return wrapper
 
 
-def fit_images(imgs: List[BytesIO], width: int = 7, limit: int = None) -> BytesIO:
-    images = []
-    if limit is None:
-        imgs = imgs
-    else:
-        imgs = imgs[:limit]
-    for img in imgs:
-        if not isinstance(img, Image.Image):
-            if isinstance(img, bytes):
-                img = BytesIO(img)
-            img = Image.open(img)
-        images.append(img.resize((128, 128)))
-
-    _width = 0
-    _height = 0
-    for img in images[:width]:
-        _width += 128
-    for img in images[::width]:
-        _height += 128
-
-    size = _width, _height
-
-    image = Image.new("RGBA", size)
-    position = [0, 0]
-    count = 0
-    for img in images:
-        try:
-            image.paste(img, tuple(position), img)
-        except ValueError:
-            image.paste(img, tuple(position))
-        count += 1
-        if count == width:
-            position[1] += 128
-            position[0] = 0
-            count = 0
-        else:
-            position[0] += 128
+def _load_tile(img: Image.Image | bytes | BytesIO, size: int) -> Image.Image:
+    opened = not isinstance(img, Image.Image)
+    if opened:
+        if isinstance(img, bytes):
+            img = BytesIO(img)
+        img = Image.open(img)
+        img.draft("RGB", (size, size))  # jpegs get decoded at a reduced scale
+
+    try:
+        # reducing_gap shrinks with the fast box reduce() before resampling
+        return img.resize((size, size), reducing_gap=2.0).convert("RGBA")
+    finally:
+        if opened:
+            img.close()
+
+
+def fit_images(
+    imgs: Iterable[Image.Image | bytes | BytesIO],
+    width: int = 7,
+    limit: int = None,
+    size: int = 128,
+) -> BytesIO:
+    """Lays the images out in a grid of width columns, each as a size by size tile"""
+    imgs = itertools.islice(imgs, limit)
+
+    # pillow releases the gil while decoding and resizing
+    tiles = map_in_pool("cpu", functools.partial(_load_tile, size=size), imgs)
+
+    columns = min(width, len(tiles))
+    rows = math.ceil(len(tiles) / width)
 
-    for img in images:
-        img.close()
+    image = Image.new("RGBA", (columns * size, rows * size))
+    for index, tile in enumerate(tiles):
+        row, column = divmod(index, width)
+        image.paste(tile, (column * size, row * size))
+        tile.close()
 
     buffer = BytesIO()
     image.save(buffer, format="png")
@@ -71,7 +76,30 @@ def fit_images(imgs: List[BytesIO], width: int = 7, limit: int = None) -> BytesI
     return buffer
 
 
+def _crop_to_center(frame: BaseImage) -> None:
+    side = min(frame.width, frame.height)
+    left = (frame.width - side) // 2
+    top = (frame.height - side) // 2
+    frame.crop(left, top, width=side, height=side)
+
+
+def _resize_keep_ratio(frame: BaseImage, size: tuple[int, int]) -> None:
+    new_width, new_height = size
+    aspect_ratio = frame.height / frame.width
+    frame.resize(new_width, max(1, int(new_height * aspect_ratio)))
+
+
+def _invert(frame: BaseImage) -> None:
+    frame.negate()
+
+
 class SequentialImageProcessor:
+    """Records operations and applies them all in a single executor call.
+
+    Frame operations are fused, every frame is touched once for the whole chain.
+    They run when the image is saved or analyzed.
+    """
+
     def __init__(self, image: bytes | BytesIO | WandImage, format: str = None) -> None:
         self.image: WandImage = None
         self.format = format
@@ -79,9 +107,12 @@ class SequentialImageProcessor:
         self._initialized = False
         self._image = image
         self._save_kwargs = {}
+        self._operations: List[Callable[[BaseImage], None]] = []
+
+    def _load(self) -> None:
+        if self._initialized:
+            return
 
-    @executor()
-    def _init(self) -> None:
         image = self._image
         if not isinstance(image, WandImage):
             if isinstance(image, BytesIO):
@@ -93,6 +124,10 @@ class SequentialImageProcessor:
 
         self._initialized = True
 
+    @executor("render")
+    def _init(self) -> None:
+        self._load()
+
     async def __aenter__(self):
         pass
 
@@ -100,46 +135,153 @@ class SequentialImageProcessor:
         if self.image:
             return await self.save()
 
-    @executor()
-    @check_initialized
-    def change_format(self, fmt: str) -> None:
-        if fmt.lower() == "jpeg":
-            self.image.colorspace = "rgb"
-
-        self.image.format = fmt
+    def change_format(self, fmt: str) -> "SequentialImageProcessor":
         self._save_kwargs["format"] = fmt
-
-    @staticmethod
+        return self
+
+    def crop_to_center(self) -> "SequentialImageProcessor":
+        self._operations.append(_crop_to_center)
+        return self
+
+    def resize_keep_ratio(self, size: tuple[int, int]) -> "SequentialImageProcessor":
+        self._operations.append(functools.partial(_resize_keep_ratio, size=size))
+        return self
+
+    def invert(self) -> "SequentialImageProcessor":
+        self._operations.append(_invert)
+        return self
+
+    def _apply(self) -> None:
+        """Decodes the image if needed and runs the recorded operations"""
+        self._load()
+
+        if fmt := self._save_kwargs.get("format"):
+            if fmt.lower() == "jpeg":
+                self.image.colorspace = "rgb"
+            self.image.format = fmt
+
+        operations, self._operations = self._operations, []
+        if not operations:
+            return
+
+        if not self.animated:
+            for operation in operations:
+                operation(self.image)
+            return
+
+        # frames of animations can be partial, they have to be full for geometry ops
+        self.image.coalesce()
+        for index in range(len(self.image.sequence)):
+            with self.image.sequence[index] as frame:
+                for operation in operations:
+                    operation(frame)
+
+    @property
     @check_initialized
     def animated(self) -> bool:
         return len(self.image.sequence) > 1
 
     @executor()
-    @check_initialized
     def close(self) -> None:
-        self.image.close()
+        if self.image:
+            self.image.close()
+
+    def _sample_pixels(self) -> np.ndarray:
+        sequence = self.image.sequence
+        step = max(1, len(sequence) // DOMINANT_COLORS_FRAMES)
+
+        pixels = []
+        for index in range(0, len(sequence), step)[:DOMINANT_COLORS_FRAMES]:
+            with WandImage(image=sequence[index]) as frame:
+                width, height = frame.size
+                scale = min(1, DOMINANT_COLORS_SIZE / max(width, height))
+                frame.sample(max(1, int(width * scale)), max(1, int(height * scale)))
+                frame.depth = 8
+                blob = frame.make_blob("RGBA")
+
+            pixels.append(np.frombuffer(blob, dtype=np.uint8).reshape(-1, 4))
+
+        return np.concatenate(pixels)
 
     @check_initialized
     def _get_dominant_colors(self) -> List[tuple[int, int, int]]:
-        # thanks chatgpt for this!!
-        pixel_colors = self.image.export_pixels(channel_map="RGB")
-
-        color_counts = {}
-        for i in range(0, len(pixel_colors), 3):
-            color = tuple(pixel_colors[i : i + 3])
-            if color not in color_counts:
-                color_counts[color] = 1
+        """Returns the colors of the image ordered by how common they are.
+
+        Frames are sampled down and the pixels grouped with k-means, groups with
+        close centers are merged afterwards. Gradients end up as one color instead
+        of being split wherever they cross a fixed bucket boundary.
+        """
+        pixels = self._sample_pixels()
+
+        opaque = pixels[pixels[:, 3] > 0]
+        rgb = (opaque if len(opaque) else pixels)[:, :3].astype(np.int64)
+
+        # clustering the distinct colors weighted by their count is much cheaper
+        packed, counts = np.unique(
+            rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2], return_counts=True
+        )
+        colors = np.stack([packed >> 16, packed >> 8 & 0xFF, packed & 0xFF], axis=1)
+        colors = colors.astype(np.float64)
+
+        # k-means++ seeding, seeded so the same image always gives the same colors
+        rng = np.random.default_rng(0)
+        k = min(DOMINANT_COLORS_CLUSTERS, len(colors))
+        centers = [colors[np.argmax(counts)]]
+        distances = ((colors - centers[0]) ** 2).sum(axis=1)
+        for _ in range(k - 1):
+            weights = distances * counts
+            if not weights.any():
+                break
+            centers.append(colors[rng.choice(len(colors), p=weights / weights.sum())])
+            distances = np.minimum(distances, ((colors - centers[-1]) ** 2).sum(axis=1))
+        centers = np.array(centers)
+
+        norms = (colors**2).sum(axis=1)[:, None]
+        for _ in range(DOMINANT_COLORS_ITERATIONS):
+            labels = np.argmin(
+                norms - 2 * colors @ centers.T + (centers**2).sum(axis=1), axis=1
+            )
+            sizes = np.bincount(labels, weights=counts, minlength=len(centers))
+            sums = np.stack(
+                [
+                    np.bincount(
+                        labels, weights=colors[:, i] * counts, minlength=len(centers)
+                    )
+                    for i in range(3)
+                ],
+                axis=1,
+            )
+            used = sizes > 0  # empty clusters keep their center
+            moved = centers.copy()
+            moved[used] = sums[used] / sizes[used, None]
+            if np.allclose(moved, centers):
+                break
+            centers = moved
+
+        merged = []  # [center, size], the biggest group absorbs its close neighbours
+        for index in np.argsort(sizes, kind="stable")[::-1]:
+            if not sizes[index]:
+                continue
+            for group in merged:
+                if np.linalg.norm(group[0] - centers[index]) < DOMINANT_COLORS_DISTANCE:
+                    total = group[1] + sizes[index]
+                    group[0] = (
+                        group[0] * group[1] + centers[index] * sizes[index]
+                    ) / total
+                    group[1] = total
+                    break
             else:
-                color_counts[color] += 1
+                merged.append([centers[index], sizes[index]])
 
-        colors = sorted(color_counts, key=color_counts.get, reverse=True)
-        return colors
+        merged.sort(key=lambda group: group[1], reverse=True)
+        return [tuple(int(round(value)) for value in center) for center, _ in merged]
 
-    @executor()
+    @executor("render")
     def get_dominant_colors(self) -> List[tuple[int, int, int]]:
+        self._apply()
         return self._get_dominant_colors()
 
-    @executor()
+    @executor("render")  # fit_images waits on the cpu pool
     @check_initialized
     def draw_dominant_colors(
         self, colors: List[tuple[int, int, int]] = None
@@ -152,10 +294,10 @@ class SequentialImageProcessor:
             image.close()
         return result
 
-    @executor()
-    @check_initialized
+    @executor("render")
     def save(self) -> BytesIO:
-        buffer = BytesIO()
+        """Runs the recorded operations and encodes the result, the only encode"""
+        self._apply()
 
         fmt = "png" if not self.animated else "gif"
         kwargs = dict(format=fmt)
@@ -163,62 +305,10 @@ class SequentialImageProcessor:
         for kwarg, value in self._save_kwargs.items():
             kwargs[kwarg] = value
 
-        buffer.write(self.image.make_blob(**kwargs))
+        buffer = BytesIO(self.image.make_blob(**kwargs))
         self.image.close()
-        buffer.seek(0)
         return buffer
 
-    @executor()
-    @check_initialized
-    def resize_keep_ratio(self, size: tuple[int, int], animated: bool = None):
-        animated = animated if animated is not None else self.animated
-
-        image = self.image
-        aspect_ratio = image.height / image.width
-        new_width, new_height = size
-        new_size = (new_width, int(new_height * aspect_ratio))
-
-        if animated:
-            for frame in image.sequence:
-                frame = frame.resize(*new_size)
-        else:
-            self.image = image.resize(*new_size)
-
-        buf = BytesIO()
-        image.save(buf, "PNG")
-        buf.seek(0)
-        return buf
-
-    @executor()
-    @check_initialized
-    def invert(self, animated: bool = None):
-        animated = animated if animated is not None else self.animated
-        self.image.iterator_reset()
-        self.image.negate()
-        if animated:
-            while self.image.iterator_next():
-                self.image.negate()
-
-    @executor()
-    @check_initialized
-    def crop_to_center(self, animated: bool = None):
-        animated = animated if animated is not None else self.animated
-        image = self.image
-
-        width, height = image.size
-
-        left = (width - height) / 2
-        top = (height - height) / 2
-        right = (width + height) / 2
-        bottom = (height + height) / 2
-        sizes = (int(left), int(top), int(right), int(bottom))
-
-        if animated:
-            for frame in image.sequence:
-                frame = frame.crop(*sizes)
-        else:
-            self.image = image.crop(*sizes)
-
 
 async def setup(bot):
     pass
@@ -1,9 +1,14 @@
-import asyncio
 from io import BytesIO
+from typing import List
 
 import magic
 
 from modules.util.executor import executor
+from modules.util.process import ResourceLimits, run
+
+MEDIA_LIMITS = ResourceLimits(
+    nice=10, cpu_time=15 * 60, memory=4 * 1024 * 1024 * 1024
+)  # applied to ffmpeg, yt-dlp and other media tools
 
 
 @executor()
@@ -11,16 +16,16 @@ def detect_content_type(buffer: BytesIO) -> str:
     return magic.from_buffer(buffer)
 
 
-async def execute(command: str, verbose: bool = False) -> str:
-    proc = await asyncio.wait_for(
-        asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=None if verbose else asyncio.subprocess.PIPE,
-        ),
-        timeout=60,
+async def execute(
+    command: List[str],
+    verbose: bool = False,
+    timeout: float = 60,
+    limits: ResourceLimits = MEDIA_LIMITS,
+    **kwargs,
+) -> str:
+    on_stderr = kwargs.pop("on_stderr", print if verbose else None)
+    result = await run(
+        *command, timeout=timeout, limits=limits, on_stderr=on_stderr, **kwargs
     )
 
-    stdout, _ = await proc.communicate()
-
-    return stdout.decode()
+    return result.stdout.decode()
@@ -4,7 +4,7 @@ import os
 import tempfile
 from dataclasses import dataclass
 from io import BytesIO
-from typing import List, TypedDict
+from typing import Any, Callable, List, TypedDict
 
 import discord
 import mutagen
@@ -14,6 +14,9 @@ from modules.util.timer import Timer
 
 from .base import execute
 from .exceptions import FailedCompressionException
+from .progress import FFmpegProgressParser, Progress
+
+COMPRESSION_TIMEOUT = 10 * 60  # 10 minutes
 
 
 @dataclass(frozen=True)
@@ -31,12 +34,14 @@ class Compressor:
         format: str = None,
         tempdir=None,
         verbose: bool = False,
+        progress: Callable[[Progress], Any] = None,
     ) -> None:
         self._path = path
         self._target_size = target_size
         self._format = format
         self._original_format = format
         self._verbose = verbose
+        self._progress = progress
         self._tempdir = tempdir or tempfile.TemporaryDirectory()
 
         self._formats = {
@@ -74,7 +79,17 @@ class Compressor:
 
     async def _get_video_duration(self, path: os.PathLike) -> float:
         out = await execute(
-            f'ffprobe -v quiet -show_streams -select_streams v:0 -of json "{path}"',
+            [
+                "ffprobe",
+                "-v",
+                "quiet",
+                "-show_streams",
+                "-select_streams",
+                "v:0",
+                "-of",
+                "json",
+                path,
+            ],
             self._verbose,
         )
         data = json.loads(out)["streams"][0]
@@ -142,7 +157,7 @@ class Compressor:
         elif isinstance(self._path, bytes):
             path = await self._convert_bytes_to_path()
 
-        cmd = ["ffmpeg", "-i", path]
+        cmd = ["ffmpeg", "-y", "-i", path]
 
         def add_args(args: List[str]):
             for arg in args:
@@ -163,10 +178,24 @@ class Compressor:
 
         last_part = path.split(".")[-1]
         output_path = path.replace(f".{last_part}", f"_compressed.{last_part}")
-        add_args([output_path])
+        add_args(["-progress", "pipe:2", "-nostats", output_path])
+
+        parser = FFmpegProgressParser(duration)
+
+        async def on_stderr(line: str):
+            if self._verbose:
+                print(line)
+
+            progress = parser(line)
+            if progress and self._progress:
+                result = self._progress(progress)
+                if inspect.isawaitable(result):
+                    await result
 
         with Timer() as timer:
-            await execute(" ".join(cmd), verbose=self._verbose)
+            await execute(
+                cmd, self._verbose, timeout=COMPRESSION_TIMEOUT, on_stderr=on_stderr
+            )
 
         sizes = {"old": os.stat(path).st_size, "new": os.stat(output_path).st_size}
 
@@ -1,3 +1,4 @@
+import asyncio
 import inspect
 import json
 import os
@@ -7,8 +8,9 @@ import string
 from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
-from typing import Any, Callable, List, Optional, TypedDict
+from typing import Any, Callable, Iterator, List, Optional, TypedDict
 
+import aiohttp
 import discord
 import eyed3
 import magic
@@ -16,6 +18,8 @@ from discord.ext import commands
 
 from core.bot import amyrin
 from core.constants import *
+from modules.util.executor import executor
+from modules.util.fetch import InvalidContentType, ResponseTooLarge, fetch
 from modules.util.handlers.nginx import NginxHandler
 from modules.util.imaging.utils import SequentialImageProcessor
 
@@ -30,6 +34,19 @@ from .exceptions import (
     NoPartsException,
     TooLong,
 )
+from .progress import (
+    YTDLP_PROGRESS_TEMPLATE,
+    Progress,
+    ThrottledUpdater,
+    parse_ytdlp_progress,
+    stage,
+)
+
+DOWNLOAD_TIMEOUT = 10 * 60  # 10 minutes
+FETCH_TIMEOUT = aiohttp.ClientTimeout(total=15)
+SUBTITLE_SIZE_LIMIT = 2 * 1024 * 1024  # 2 mb
+THUMBNAIL_SIZE_LIMIT = 4 * 1024 * 1024  # 4 mb
+THUMBNAIL_CONTENT_TYPES = ["image/jpeg", "image/png", "image/webp"]
 
 
 @dataclass(frozen=True)
@@ -62,23 +79,25 @@ def format_duration(duration_ms):
         return "{:d}:{:02d}.{:03d}".format(minutes, seconds, milliseconds)
 
 
-async def parse_subtitles(data: dict) -> str:
-    lines: List[str] = []
+def parse_subtitles(data: dict) -> Iterator[str]:
+    for event in data.get("events") or []:
+        segs = event.get("segs")
+        if not segs:
+            continue
 
-    events = data.get("events")
-    for event in events:
-        start_ms = event.get("tStartMs")
-        end_ms = start_ms + event.get("dDurationMs")
+        start_ms = event.get("tStartMs", 0)
+        end_ms = start_ms + event.get("dDurationMs", 0)
 
         start = format_duration(start_ms)
         end = format_duration(end_ms)
 
-        for seg in event.get("segs"):
+        for seg in segs:
             for value in seg.values():
-                for line in value.splitlines():
-                    lines.append(f"[{start}-{end}]{line}")
+                if not isinstance(value, str):
+                    continue
 
-    return lines
+                for line in value.splitlines():
+                    yield f"[{start}-{end}]{line}"
 
 
 class Downloader:
@@ -111,7 +130,8 @@ class Downloader:
         self._output = output
         self._close_after = close_after
         self._verbose = verbose
-        self._updater = updater
+        self._updater = ThrottledUpdater(updater) if updater else None
+        self._status = None
         self._nginx = nginx
         self._include_tags = include_tags
 
@@ -159,7 +179,7 @@ class Downloader:
         return "".join(random.choices(string.ascii_letters, k=12))
 
     async def _extract_info(self) -> dict:
-        out = await execute(f'yt-dlp -j "{self._url}"')
+        out = await execute(["yt-dlp", "-j", "--no-playlist", "--", self._url])
         return json.loads(out)
 
     async def _check_validity(self, age_limit: int = 18) -> bool:
@@ -182,8 +202,16 @@ class Downloader:
         return data
 
     async def _update(self, message: str):
+        self._status = message
         if self._updater:
-            return await self._updater(message)
+            return await self._updater(message, force=True)
+
+    async def _report_progress(self, progress: Optional[Progress]):
+        if progress is None or not self._updater:
+            return
+
+        if fmt_progress := progress.format():
+            await self._updater(f"{self._status}\n{fmt_progress}")
 
     def _convert_to_content_type(self, key: str) -> str:
         conversion_map = {"mp4": "video/mp4", "mp3": "audio/mpeg"}
@@ -195,52 +223,98 @@ class Downloader:
 
         return conversion_map.get(key)
 
-    async def _tag_audio_file(self, data: dict, path: os.PathLike) -> None:
+    async def _fetch_subtitles(self, data: dict) -> Optional[str]:
+        tracks = next(
+            (
+                tracks
+                for name, tracks in (data.get("subtitles") or {}).items()
+                if name.startswith("en") and tracks
+            ),
+            None,
+        )
+        if not tracks:
+            return
+
+        subtitle = next((x for x in tracks if x.get("ext") == "json3"), tracks[0])
+        if not (url := subtitle.get("url")):
+            return
+
+        try:
+            result = await fetch(
+                self._client.session,
+                url,
+                limit=SUBTITLE_SIZE_LIMIT,
+                timeout=FETCH_TIMEOUT,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ResponseTooLarge) as exc:
+            self._debug(f"Failed to fetch subtitles: {exc!r}")
+            return
+
+        try:
+            return "\n".join(parse_subtitles(json.loads(result.data)))
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            return
+
+    async def _fetch_thumbnail(self, data: dict) -> Optional[tuple[bytes, str]]:
+        thumbnails = data.get("thumbnails")
+        if not thumbnails or not (url := thumbnails[-1].get("url")):
+            return
+
+        try:
+            result = await fetch(
+                self._client.session,
+                url,
+                limit=THUMBNAIL_SIZE_LIMIT,
+                content_types=THUMBNAIL_CONTENT_TYPES,
+                timeout=FETCH_TIMEOUT,
+            )
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            InvalidContentType,
+            ResponseTooLarge,
+        ) as exc:
+            self._debug(f"Failed to fetch thumbnail: {exc!r}")
+            return
+
+        return result.data, result.content_type
+
+    @executor()
+    def _write_tags(
+        self,
+        path: os.PathLike,
+        data: dict,
+        lyrics: Optional[str],
+        thumbnail: Optional[tuple[bytes, str]],
+    ) -> None:
         audio = eyed3.load(path)
-        title = data.get("fulltitle", data.get("title", "N/A"))
-        channel = data.get("channel", "N/A")
-        audio.tag.title = title
-        audio.tag.artist = channel
+        if audio.tag is None:
+            audio.initTag()
+
+        audio.tag.title = data.get("fulltitle", data.get("title", "N/A"))
+        audio.tag.artist = data.get("channel", "N/A")
 
         if upload_date := data.get("upload_date"):
             date_format = "%Y%m%d"
             date = datetime.strptime(upload_date, date_format)
             audio.tag.recording_date = date.year
 
-        if subtitles := data.get("subtitles"):
-            for name, subtitles in subtitles.items():
-                if not name.startswith("en") or not subtitles:
-                    continue
+        if lyrics:
+            audio.tag.lyrics.set(lyrics, "Synchronized lyrics", b"eng")
 
-                subtitle = subtitles[0]
-                url = subtitle.get("url")
-                async with self._client.session.get(url) as resp:
-                    if resp.status != 200:
-                        continue
-
-                    subtitles = await resp.json()
-                    parsed_subtitles = await parse_subtitles(subtitles)
-                    audio.tag.lyrics.set(
-                        "\n".join(parsed_subtitles), "Synchronized lyrics", b"eng"
-                    )
-
-        if thumbnails := data.get("thumbnails"):
-            thumbnail = thumbnails[-1].get("url")
-            if thumbnail:
-                async with self._client.session.get(thumbnail) as resp:
-                    if resp.status == 200:
-                        content_type = resp.headers.get("Content-Type", "image/jpeg")
-                        imagedata = await resp.read()
-
-                        audio.tag.images.set(
-                            3,
-                            imagedata,
-                            content_type,
-                            "YouTube Thumbnail",
-                        )
+        if thumbnail:
+            imagedata, content_type = thumbnail
+            audio.tag.images.set(3, imagedata, content_type, "YouTube Thumbnail")
 
         audio.tag.save()
 
+    async def _tag_audio_file(self, data: dict, path: os.PathLike) -> None:
+        lyrics, thumbnail = await asyncio.gather(
+            self._fetch_subtitles(data), self._fetch_thumbnail(data)
+        )
+
+        await self._write_tags(path, data, lyrics, thumbnail)
+
     async def _download(self, data: dict):
         cmd = ["yt-dlp"]
 
@@ -257,19 +331,31 @@ class Downloader:
         name = data.get("title")
         filename = name + "." + self._format
         path = os.path.join(output, filename)
-        add_args(["--output", f'"{path}"'])
+        add_args(["--output", path, "--no-playlist"])
+        add_args(["--quiet", "--progress", "--newline"])
+        add_args(["--progress-template", YTDLP_PROGRESS_TEMPLATE])
 
         if self._format == "mp3":
-            add_args(["--extract-audio", "--audio-format mp3"])
+            add_args(["--extract-audio", "--audio-format", "mp3"])
         elif self._format == "mp4":
             add_args(["-f", "mp4"])
 
-        add_args([f'"{self._url}"'])
+        add_args(["--", self._url])
 
-        fmt_cmd = " ".join(cmd)
-        self._debug(fmt_cmd)
+        self._debug(" ".join(cmd))
 
-        await execute(fmt_cmd)
+        async def on_output(line: str):
+            if progress := parse_ytdlp_progress(line):
+                return await self._report_progress(progress)
+            self._debug(line)
+
+        with stage("download"):
+            await execute(
+                cmd,
+                timeout=DOWNLOAD_TIMEOUT,
+                on_stdout=on_output,
+                on_stderr=on_output,
+            )
 
         if self._close_after:
             try:
@@ -290,7 +376,8 @@ class Downloader:
                 os.rename(path, new_path)
 
         if self._format == "mp3" and self._include_tags:
-            await self._tag_audio_file(data, new_path)
+            with stage("tagging"):
+                await self._tag_audio_file(data, new_path)
 
         return new_path, content_type_converted
 
@@ -298,15 +385,25 @@ class Downloader:
         if self._nginx is None:
             raise MissingNginxHandler("nginx kwarg is required when using cdn")
 
-        return await self._nginx.add(path)
+        with stage("upload"):
+            return await self._nginx.add(path)
 
     async def download(self, age_limit: int = 18) -> FileDownload | URLDownload:
+        try:
+            return await self._process(age_limit)
+        finally:
+            if self._updater:
+                # drop queued progress edits so they can't overwrite the result
+                self._updater.cancel()
+
+    async def _process(self, age_limit: int) -> FileDownload | URLDownload:
         if not self._url_regex.match(self._url):
             raise MediaException("URL isn't a valid URL")
 
         await self._update(f"{LOADING} Checking validity")
 
-        data = await self._check_validity(age_limit=age_limit)
+        with stage("validity"):
+            data = await self._check_validity(age_limit=age_limit)
 
         typename = (
             "video"
@@ -339,9 +436,11 @@ class Downloader:
                 format=self._format,
                 tempdir=self._output,
                 verbose=self._verbose,
+                progress=self._report_progress,
             )
 
-            data: CompressionResult = await compressor.compress()
+            with stage("compression"):
+                data: CompressionResult = await compressor.compress()
             path = data.path
             compression_time = data.compression_time
 
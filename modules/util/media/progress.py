@@ -0,0 +1,167 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import humanfriendly
+
+from modules.util.metrics import metrics
+
+# passed to yt-dlp with --progress-template, fields are NA when unknown
+YTDLP_PROGRESS_PREFIX = "[progress]"
+YTDLP_PROGRESS_TEMPLATE = (
+    "download:"
+    + YTDLP_PROGRESS_PREFIX
+    + " %(progress.downloaded_bytes)s"
+    + " %(progress.total_bytes,progress.total_bytes_estimate)s"
+    + " %(progress.speed)s"
+    + " %(progress.eta)s"
+)
+
+
+@dataclass(frozen=True)
+class Progress:
+    stage: str
+    percent: Optional[float] = None
+    speed: Optional[str] = None
+    eta: Optional[float] = None
+
+    def format(self) -> str:
+        parts = []
+        if self.percent is not None:
+            parts.append(f"`{self.percent:.1f}%`")
+        if self.speed:
+            parts.append(self.speed)
+        if self.eta is not None:
+            parts.append(f"ETA {humanfriendly.format_timespan(int(self.eta))}")
+
+        return " | ".join(parts)
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_ytdlp_progress(line: str) -> Optional[Progress]:
+    if not line.startswith(YTDLP_PROGRESS_PREFIX):
+        return
+
+    values = line[len(YTDLP_PROGRESS_PREFIX) :].split()
+    if len(values) != 4:
+        return
+
+    downloaded, total, speed, eta = (_to_float(value) for value in values)
+
+    percent = None
+    if downloaded is not None and total:
+        percent = min(100.0, downloaded / total * 100)
+
+    fmt_speed = None
+    if speed is not None:
+        fmt_speed = humanfriendly.format_size(speed, binary=True) + "/s"
+
+    metrics.gauge("media_progress_percent", stage="download").set(percent or 0)
+    if speed is not None:
+        metrics.gauge("media_download_speed_bytes").set(speed)
+
+    return Progress("download", percent, fmt_speed, eta)
+
+
+class FFmpegProgressParser:
+    """Parses the key=value blocks written by ffmpeg's -progress option"""
+
+    def __init__(self, duration: float, stage: str = "compression") -> None:
+        self.duration = duration
+        self.stage = stage
+        self._values: Dict[str, str] = {}
+
+    def __call__(self, line: str) -> Optional[Progress]:
+        key, sep, value = line.partition("=")
+        if not sep:
+            return
+
+        self._values[key.strip()] = value.strip()
+        if key != "progress":  # the progress key terminates each block
+            return
+
+        values, self._values = self._values, {}
+
+        out_time = _to_float(values.get("out_time_us", "N/A"))
+        speed = _to_float(values.get("speed", "N/A").rstrip("x"))
+
+        percent = eta = None
+        if out_time is not None and self.duration:
+            seconds = out_time / 1_000_000
+            percent = max(0.0, min(100.0, seconds / self.duration * 100))
+            if speed:
+                eta = max(0.0, (self.duration - seconds) / speed)
+
+        if value == "end":
+            percent, eta = 100.0, 0.0
+
+        metrics.gauge("media_progress_percent", stage=self.stage).set(percent or 0)
+        if speed is not None:
+            metrics.gauge("media_ffmpeg_speed", stage=self.stage).set(speed)
+
+        return Progress(self.stage, percent, f"{speed}x" if speed else None, eta)
+
+
+class ThrottledUpdater:
+    """Rate limits an update function, only ever delivering the latest message"""
+
+    def __init__(
+        self, updater: Callable[[str], Awaitable[Any]], interval: float = 2.0
+    ) -> None:
+        self._updater = updater
+        self._interval = interval
+        self._last = 0.0
+        self._pending: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, message: str) -> Any:
+        self._last = time.monotonic()
+        self._pending = None
+        metrics.counter("media_status_edits_total").inc()
+        return await self._updater(message)
+
+    async def _delayed_send(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._task = None
+        if self._pending is not None:
+            await self._send(self._pending)
+
+    async def __call__(self, message: str, force: bool = False) -> Any:
+        if force:
+            self.cancel()
+            return await self._send(message)
+
+        elapsed = time.monotonic() - self._last
+        if elapsed >= self._interval and self._task is None:
+            return await self._send(message)
+
+        self._pending = message
+        metrics.counter("media_status_edits_dropped_total").inc()
+        if self._task is None:
+            self._task = asyncio.create_task(
+                self._delayed_send(self._interval - elapsed)
+            )
+
+    def cancel(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._pending = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    with metrics.histogram("media_stage_seconds", stage=name).time():
+        yield
+
+
+async def setup(bot):
+    pass
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from expiringdict import ExpiringDict
+
+from modules.util.executor import executor
+from modules.util.metrics import metrics
+
+from .base import execute
+
+EXCERPT_LENGTH = 12  # seconds, songrec only needs a few seconds of audio
+RECOGNITION_TIMEOUT = 60
+
+
+@executor()
+def hash_file(path: os.PathLike, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class SongRecognizer:
+    """Recognizes songs with songrec using short excerpts, a bounded worker pool and a result cache"""
+
+    def __init__(
+        self, workers: int = 2, cache_size: int = 512, cache_age: int = 24 * 60 * 60
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(workers)
+        self._cache: Dict[str, dict] = ExpiringDict(
+            max_len=cache_size, max_age_seconds=cache_age
+        )
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def _get_duration(self, path: os.PathLike) -> Optional[float]:
+        out = await execute(
+            [
+                "ffprobe",
+                "-v",
+                "quiet",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "json",
+                path,
+            ]
+        )
+        try:
+            return float(json.loads(out)["format"]["duration"])
+        except (json.JSONDecodeError, KeyError, ValueError):
+            return None
+
+    async def _extract_excerpt(self, path: os.PathLike) -> os.PathLike:
+        # skip into the track a bit, intros are often quiet or generic
+        duration = await self._get_duration(path)
+        start = 0
+        if duration:
+            start = max(0, min(duration * 0.3, duration - EXCERPT_LENGTH))
+
+        output = os.path.splitext(path)[0] + "_excerpt.wav"
+        await execute(
+            [
+                "ffmpeg",
+                "-y",
+                "-v",
+                "error",
+                "-ss",
+                f"{start:.2f}",
+                "-i",
+                path,
+                "-t",
+                str(EXCERPT_LENGTH),
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                "16000",
+                output,
+            ]
+        )
+        return output
+
+    async def _recognize(self, path: os.PathLike) -> dict:
+        queue_depth = metrics.gauge("recognizer_queue_depth")
+        queue_depth.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            queue_depth.dec()
+
+        try:
+            with metrics.histogram("recognizer_seconds").time():
+                excerpt = await self._extract_excerpt(path)
+                if not os.path.isfile(excerpt):
+                    excerpt = path
+
+                out = await execute(
+                    ["songrec", "audio-file-to-recognized-song", excerpt],
+                    timeout=RECOGNITION_TIMEOUT,
+                )
+        finally:
+            self._semaphore.release()
+
+        return json.loads(out)
+
+    async def recognize(self, path: os.PathLike) -> dict:
+        """Returns the songrec result for the given audio or video file"""
+        digest = await hash_file(path)
+
+        if (result := self._cache.get(digest)) is not None:
+            metrics.counter("recognizer_cache_total", result="hit").inc()
+            return result
+
+        if digest in self._pending:
+            metrics.counter("recognizer_cache_total", result="pending").inc()
+            return await asyncio.shield(self._pending[digest])
+
+        metrics.counter("recognizer_cache_total", result="miss").inc()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[digest] = future
+        try:
+            result = await self._recognize(path)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark as retrieved when nobody else waits on it
+            raise
+        else:
+            future.set_result(result)
+            if result.get("track"):  # failed recognitions are retried next time
+                self._cache[digest] = result
+            return result
+        finally:
+            self._pending.pop(digest, None)
+
+
+async def setup(bot):
+    pass
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    """Keeps a total count and sum plus a window of the most recent samples for percentiles"""
+
+    def __init__(self, size: int = 1024) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def percentile(self, percentile: float) -> float:
+        if not self.samples:
+            return 0.0
+
+        samples = sorted(self.samples)
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    @property
+    def average(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Labels], Counter | Gauge | Histogram] = {}
+
+    def _get(self, cls: type, name: str, labels: Dict[str, str]):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, cls())
+
+        if not isinstance(metric, cls):
+            raise TypeError(f'metric "{name}" is a {type(metric).__name__}')
+
+        return metric
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, **labels: str) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        return self._get(Histogram, name, labels)
+
+    def collect(
+        self, prefix: Optional[str] = None
+    ) -> List[Tuple[str, Labels, Counter | Gauge | Histogram]]:
+        with self._lock:
+            items = list(self._metrics.items())
+
+        return [
+            (name, labels, metric)
+            for (name, labels), metric in sorted(items, key=lambda x: x[0])
+            if prefix is None or name.startswith(prefix)
+        ]
+
+    def drain(self) -> List[tuple]:
+        """Returns and resets the counters and histograms, used to ship metrics out of worker processes"""
+        changes = []
+        for name, labels, metric in self.collect():
+            if isinstance(metric, Counter) and metric.value:
+                changes.append(("counter", name, labels, metric.value))
+                metric.value = 0
+            elif isinstance(metric, Histogram) and metric.count:
+                samples = list(metric.samples)[-metric.count :]
+                changes.append(("histogram", name, labels, samples))
+                metric.samples.clear()
+                metric.count = 0
+                metric.sum = 0.0
+
+        return changes
+
+    def merge(self, changes: List[tuple]) -> None:
+        for kind, name, labels, value in changes:
+            if kind == "counter":
+                self.counter(name, **dict(labels)).inc(value)
+            elif kind == "histogram":
+                histogram = self.histogram(name, **dict(labels))
+                for sample in value:
+                    histogram.observe(sample)
+
+    def format(self, prefix: Optional[str] = None) -> List[str]:
+        lines = []
+        for name, labels, metric in self.collect(prefix):
+            fmt_labels = ",".join(f'{k}="{v}"' for k, v in labels)
+            key = f"{name}{{{fmt_labels}}}" if fmt_labels else name
+
+            if isinstance(metric, Histogram):
+                value = (
+                    f"count={metric.count} avg={metric.average:.3f} "
+                    f"p50={metric.percentile(50):.3f} p95={metric.percentile(95):.3f} "
+                    f"p99={metric.percentile(99):.3f}"
+                )
+            else:
+                value = f"{metric.value:g}"
+
+            lines.append(f"{key} {value}")
+
+        return lines
+
+    def format_prometheus(self) -> str:
+        """Formats every metric in the prometheus text format, histograms become summaries"""
+        kinds = {Counter: "counter", Gauge: "gauge", Histogram: "summary"}
+
+        lines = []
+        previous = None
+        for name, labels, metric in self.collect():
+            if name != previous:
+                lines.append(f"# TYPE {name} {kinds[type(metric)]}")
+                previous = name
+
+            if isinstance(metric, Histogram):
+                for quantile in ("0.5", "0.95", "0.99"):
+                    key = _sample_key(name, labels + (("quantile", quantile),))
+                    value = metric.percentile(float(quantile) * 100)
+                    lines.append(f"{key} {value:g}")
+
+                lines.append(f"{_sample_key(name + '_sum', labels)} {metric.sum:g}")
+                lines.append(f"{_sample_key(name + '_count', labels)} {metric.count}")
+            else:
+                lines.append(f"{_sample_key(name, labels)} {metric.value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _sample_key(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+
+    fmt_labels = ",".join(f'{k}="{v.translate(_LABEL_ESCAPES)}"' for k, v in labels)
+    return f"{name}{{{fmt_labels}}}"
+
+
+metrics = Metrics()
+
+
+async def setup(bot):
+    pass
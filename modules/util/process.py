@@ -0,0 +1,178 @@
+import asyncio
+import inspect
+import os
+import resource
+import signal
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence
+
+from modules.util.metrics import metrics
+
+STDERR_LINE_LIMIT = 2000  # amount of stderr lines kept for the result
+STREAM_LIMIT = 1024 * 1024  # 1 mb, maximum length of a single output line
+
+
+class ProcessTimeout(Exception):
+    def __init__(self, command: Sequence[str], timeout: float, *args: object) -> None:
+        self.command = tuple(command)
+        self.timeout = timeout
+
+        super().__init__(
+            f"{command[0]} exceeded the timeout of {timeout} seconds", *args
+        )
+
+
+class ProcessFailed(Exception):
+    def __init__(self, result: "ProcessResult", *args: object) -> None:
+        self.result = result
+
+        super().__init__(
+            f"{result.args[0]} exited with code {result.returncode}", *args
+        )
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    nice: Optional[int] = None
+    cpu_time: Optional[int] = None  # seconds of cpu time
+    memory: Optional[int] = None  # bytes of address space
+
+    def apply(self) -> None:
+        """Applies the limits to the current process, used as a preexec_fn"""
+        if self.nice:
+            os.nice(self.nice)
+        if self.cpu_time:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time))
+        if self.memory:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory, self.memory))
+
+
+@dataclass(frozen=True)
+class ProcessResult:
+    args: tuple
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    took: float
+
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _read_lines(
+    stream: asyncio.StreamReader,
+    callback: Callable[[str], Any],
+    maxlen: Optional[int] = None,
+) -> bytes:
+    lines = deque(maxlen=maxlen)
+    async for line in stream:
+        lines.append(line)
+        result = callback(line.decode(errors="replace").rstrip())
+        if inspect.isawaitable(result):
+            await result
+
+    return b"".join(lines)
+
+
+async def _communicate(
+    proc: asyncio.subprocess.Process,
+    stdin: Optional[bytes],
+    on_stdout: Optional[Callable[[str], Any]],
+    on_stderr: Optional[Callable[[str], Any]],
+) -> tuple[bytes, bytes]:
+    async def feed():
+        if stdin is None:
+            return
+
+        proc.stdin.write(stdin)
+        await proc.stdin.drain()
+        proc.stdin.close()
+
+    if on_stdout:
+        read_stdout = _read_lines(proc.stdout, on_stdout)
+    else:
+        read_stdout = proc.stdout.read()
+
+    read_stderr = _read_lines(
+        proc.stderr, on_stderr or (lambda _: None), maxlen=STDERR_LINE_LIMIT
+    )
+
+    _, stdout, stderr = await asyncio.gather(feed(), read_stdout, read_stderr)
+    await proc.wait()
+    return stdout, stderr
+
+
+async def run(
+    *args: str,
+    timeout: Optional[float] = 60,
+    limits: Optional[ResourceLimits] = None,
+    stdin: Optional[bytes] = None,
+    on_stdout: Optional[Callable[[str], Any]] = None,
+    on_stderr: Optional[Callable[[str], Any]] = None,
+    cwd: Optional[os.PathLike] = None,
+    check: bool = False,
+) -> ProcessResult:
+    """Runs a program without a shell in its own process group.
+
+    The timeout covers the whole lifetime of the process, and the process group
+    is killed if the timeout is exceeded or the awaiting task gets cancelled.
+    Passing on_stdout or on_stderr streams the output line by line to them.
+    """
+    args = tuple(str(arg) for arg in args)
+    tool = os.path.basename(args[0])
+    outcome = "error"
+
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE
+        if stdin is not None
+        else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        limit=STREAM_LIMIT,
+        start_new_session=True,
+        preexec_fn=limits.apply if limits else None,
+    )
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            _communicate(proc, stdin, on_stdout, on_stderr), timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        _kill(proc)
+        await proc.wait()
+        raise ProcessTimeout(args, timeout)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        _kill(proc)
+        raise
+    else:
+        outcome = "ok" if proc.returncode == 0 else "error"
+    finally:
+        took = time.perf_counter() - start
+        _kill(proc)
+        metrics.histogram("process_runtime_seconds", tool=tool).observe(took)
+        metrics.counter("process_runs_total", tool=tool, outcome=outcome).inc()
+
+    result = ProcessResult(args, proc.returncode, stdout, stderr, took)
+
+    if check and result.returncode != 0:
+        raise ProcessFailed(result)
+
+    return result
+
+
+async def setup(bot):
+    pass
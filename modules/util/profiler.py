@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from modules.util.executor import run_in_pool
+
+Frame = Tuple[str, str, int]  # filename, function name, first line
+
+# innermost frames of threads that are waiting for work, skipped unless idle is set
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),  # concurrent.futures workers block in a c queue
+}
+
+_POOL_SUFFIX = re.compile(r"_\d+$")  # ThreadPoolExecutor numbers its threads
+_LIBRARY_PATH = re.compile(r".*[/\\](?:site-packages|python3\.\d+)[/\\]")
+_lock = threading.Lock()
+
+
+def _short_path(filename: str) -> str:
+    """Paths relative to the bot or to the library directory they are in"""
+    if filename.startswith(os.getcwd()):
+        return os.path.relpath(filename)
+
+    return _LIBRARY_PATH.sub("", filename)
+
+
+class Profile:
+    """The result of a profiling run, sampled stacks plus an optional allocation diff"""
+
+    def __init__(
+        self,
+        samples: Counter,
+        duration: float,
+        interval: float,
+        allocations: Optional[List[tracemalloc.StatisticDiff]] = None,
+    ) -> None:
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+        self.allocations = allocations
+
+    @staticmethod
+    def _format_frame(frame: Frame) -> str:
+        filename, name, line = frame
+        return f"{name} ({_short_path(filename)}:{line})"
+
+    def folded(self) -> str:
+        """The stacks in the folded format of flamegraph.pl and speedscope"""
+        lines = []
+        for (thread, frames), count in self.samples.most_common():
+            stack = [thread] + [self._format_frame(frame) for frame in frames]
+            lines.append(f"{';'.join(stack)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self, limit: int = 30) -> str:
+        total = sum(self.samples.values())
+        own = Counter()
+        cumulative = Counter()
+        for (_, frames), count in self.samples.items():
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):  # recursion counts once per sample
+                cumulative[frame] += count
+
+        lines = [
+            f"{total} samples over {self.duration:g}s, one every {self.interval * 1000:g}ms",
+            "",
+            f"Top {limit} functions by own time",
+        ]
+        for frame, count in own.most_common(limit):
+            lines.append(
+                f"{count / total:>7.1%} {count:>7} {self._format_frame(frame)}"
+            )
+
+        lines += ["", f"Top {limit} functions by cumulative time"]
+        for frame, count in cumulative.most_common(limit):
+            lines.append(
+                f"{count / total:>7.1%} {count:>7} {self._format_frame(frame)}"
+            )
+
+        if self.allocations is not None:
+            lines += ["", f"Top {limit} allocation changes"]
+            lines += [str(stat) for stat in self.allocations[:limit]]
+
+        return "\n".join(lines) + "\n"
+
+
+class Sampler:
+    """Samples the stacks of every thread from a helper thread, like py-spy does from outside"""
+
+    def __init__(self, interval: float = 0.01, idle: bool = False) -> None:
+        self.interval = interval
+        self.idle = idle
+        self.samples: Counter = Counter()
+
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frames: Dict[object, Frame] = {}  # code objects to frames
+
+    def _frame(self, frame: FrameType) -> Frame:
+        code = frame.f_code
+        result = self._frames.get(code)
+        if result is None:
+            result = (code.co_filename, code.co_name, code.co_firstlineno)
+            self._frames[code] = result
+
+        return result
+
+    def _sample(self) -> None:
+        names = {
+            thread.ident: _POOL_SUFFIX.sub("", thread.name)
+            for thread in threading.enumerate()
+        }
+        own = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+
+            frames = []
+            while frame is not None:
+                frames.append(self._frame(frame))
+                frame = frame.f_back
+
+            if not frames:
+                continue
+
+            filename, name, _ = frames[0]
+            if not self.idle and (os.path.basename(filename), name) in IDLE_FRAMES:
+                continue
+
+            frames.reverse()
+            self.samples[(names.get(ident, str(ident)), tuple(frames))] += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def running() -> bool:
+    return _lock.locked()
+
+
+async def profile(
+    duration: float,
+    interval: float = 0.01,
+    allocations: bool = False,
+    idle: bool = False,
+) -> Profile:
+    """Samples every thread of the process for duration seconds.
+
+    With allocations, tracemalloc snapshots taken at the start and the end
+    are compared, allocations from executor threads are included as well.
+    Only one profile can run at a time.
+    """
+    if not _lock.acquire(blocking=False):
+        raise RuntimeError("a profile is already running")
+
+    started_tracing = False
+    try:
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            started_tracing = True
+        before = None
+        if allocations:  # snapshots of a big heap take a while
+            before = await run_in_pool("cpu", tracemalloc.take_snapshot)
+
+        sampler = Sampler(interval, idle)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            sampler.stop()
+
+        stats = None
+        if allocations:
+            after = await run_in_pool("cpu", tracemalloc.take_snapshot)
+            stats = await run_in_pool("cpu", after.compare_to, before, "lineno")
+
+        return Profile(sampler.samples, duration, interval, stats)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _lock.release()
+
+
+async def setup(bot):
+    pass
@@ -21,7 +21,8 @@ from sphobjinv import DataObjStr, Inventory
 
 from core.bot import amyrin
 from core.constants import *
-from modules.util.executor import executor
+from modules.util.executor import executor, run_in_pool
+from modules.util.process import run
 from modules.util.timer import Timer
 
 
@@ -127,7 +128,23 @@ class SearchResults:
 
 
 class DocScraper:
-    def __init__(self, browser: Optional[Browser] = None, bot: amyrin = None):
+    """Caches and searches the discord.py documentation and source code.
+
+    The caches are stored on the bot so they survive reloads. The inventory,
+    source tree and manual pages can be read from disk instead of fetched,
+    and autostart=False leaves building the caches to the caller.
+    """
+
+    def __init__(
+        self,
+        browser: Optional[Browser] = None,
+        bot: amyrin = None,
+        *,
+        autostart: bool = True,
+        inventory: Optional[os.PathLike] = None,
+        rtfs_root: Optional[os.PathLike] = None,
+        pages: Optional[os.PathLike] = None,
+    ):
         self._logger: logging.Logger = None
 
         self._browser = browser
@@ -135,6 +152,9 @@ class DocScraper:
 
         self._base_url = "https://dpy.rtd.amyr.in/"
         self._inv_url = urljoin(self._base_url, "objects.inv")
+        self._inv_path = inventory
+        self._rtfs_root = rtfs_root or os.path.join(os.getcwd(), "rtfs_repos")
+        self._pages_path = pages
 
         self.strgcls._docs_cache: List[Documentation]
         self.strgcls._docs_caching_progress: Dict[str, Exception]
@@ -177,17 +197,26 @@ class DocScraper:
         if not getattr(self.strgcls, "_inv", None):
             self.strgcls._inv = None
 
-        if not getattr(self.strgcls, "_rtfm_caching_task", None):
+        for name in ("_rtfm_caching_task", "_rtfs_caching_task", "_docs_caching_task"):
+            if not hasattr(self.strgcls, name):
+                setattr(self.strgcls, name, None)
+
+        if autostart:
+            self.start()
+
+    def start(self) -> None:
+        """Starts the caching tasks that are not running or done yet"""
+        if not self.strgcls._rtfm_caching_task:
             self.strgcls._rtfm_caching_task = asyncio.create_task(
                 self._build_rtfm_cache()
             )
 
-        if not getattr(self.strgcls, "_rtfs_caching_task", None):
+        if not self.strgcls._rtfs_caching_task:
             self.strgcls._rtfs_caching_task = asyncio.create_task(
                 self._build_rtfs_cache()
             )
 
-        if not getattr(self.strgcls, "_docs_caching_task", None):
+        if not self.strgcls._docs_caching_task:
             self.strgcls._docs_caching_task = asyncio.create_task(
                 self._cache_all_documentations()
             )
@@ -197,8 +226,7 @@ class DocScraper:
         return self._bot
 
     def _setup_logger(self) -> None:
-        if not os.path.isdir("logs/scrapers"):
-            os.mkdir("logs/scrapers")
+        os.makedirs("logs/scrapers", exist_ok=True)
 
         logger = logging.getLogger(__name__)
         logger.setLevel(logging.INFO)
@@ -218,26 +246,16 @@ class DocScraper:
 
         self._logger = logger
 
-    async def _shell(self, command: str) -> str:
-        proc = await asyncio.wait_for(
-            asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            ),
-            timeout=60,
-        )
+    async def _shell(self, *args: str, timeout: float = 300) -> tuple[str, str]:
+        result = await run(*args, timeout=timeout)
 
-        stdout, stderr = await proc.communicate()
-
-        return stdout.decode(), stderr.decode()
+        return result.stdout.decode(), result.stderr.decode()
 
     def _rtfs_index_file(self, filepath: os.PathLike) -> None:
         repo, _, _, _ = self._rtfs_repo
 
         def append_item(name: str, file: os.PathLike, position: set[int, int]):
-            repos_path = os.path.join(os.getcwd(), "rtfs_repos")
-            repo_path = os.path.join(repos_path, repo)
+            repo_path = os.path.join(self._rtfs_root, repo)
             filepath = file[len(repo_path) :]
             path = filepath.split("/")[:-1]
 
@@ -279,7 +297,7 @@ class DocScraper:
                     name = f"{node.name}.{child.name}"
                     append_item(name, filepath, child_position)
 
-    @executor()
+    @executor("parse")
     def _rtfs_index_directory(self, path: os.PathLike):
         for root, _, files in os.walk(path):
             for file in files:
@@ -302,19 +320,20 @@ class DocScraper:
 
         repo, url, _, dir_name = self._rtfs_repo
 
-        rtfs_repos = os.path.join(os.getcwd(), "rtfs_repos")
-        rtfs_repo = os.path.join(rtfs_repos, repo)
+        rtfs_repo = os.path.join(self._rtfs_root, repo)
         path = os.path.join(rtfs_repo, dir_name)
 
         if not os.path.isdir(path):
-            code = f"git clone {url} {rtfs_repo}"
-            print(code)
-            await self._shell(code)
+            self._logger.info(f"Cloning {url} into {rtfs_repo}")
+            await self._shell("git", "clone", "--", url, rtfs_repo)
 
+        # frozen source trees are not checkouts
         commit_path = os.path.join(rtfs_repo, ".git/refs/heads/master")
-
-        with open(commit_path) as f:
-            self.strgcls._rtfs_commit = f.readline().strip()
+        if os.path.isfile(commit_path):
+            with open(commit_path) as f:
+                self.strgcls._rtfs_commit = f.readline().strip()
+        else:
+            self.strgcls._rtfs_commit = None
 
         await self._rtfs_index_directory(path)
 
@@ -326,9 +345,10 @@ class DocScraper:
         limit: Optional[int] = None,
         updater: Callable = None,
     ) -> List[RTFSItem]:
-        if not self.strgcls._rtfs_caching_task.done():
+        task = self.strgcls._rtfs_caching_task
+        if task and not task.done():
             await self.update(updater, "Waiting for RTFS caching task")
-            await self.strgcls._rtfs_caching_task
+            await task
 
         results = []
 
@@ -350,9 +370,18 @@ class DocScraper:
 
         return RTFSResults(matches)
 
+    @executor("io")
+    def _read_page(self, url: str) -> str:
+        path = url[len(self._base_url) :].split("#")[0] or "index.html"
+        with open(os.path.join(self._pages_path, path), encoding="utf-8") as f:
+            return f.read()
+
     async def _get_html(
         self, url: str, id: str, timeout: int = 0, wait: bool = True
     ) -> str:
+        if self._pages_path is not None:
+            return await self._read_page(url)
+
         page = await self._browser.new_page()
 
         await page.goto(url)
@@ -415,7 +444,7 @@ class DocScraper:
 
         return " ".join(text)
 
-    @executor()
+    @executor("parse")
     def _get_documentation(self, element: Tag, page_url: str) -> Documentation:
         url = element.find("a", class_="headerlink").get("href", None)
         full_url = urljoin(page_url, url)
@@ -467,9 +496,7 @@ class DocScraper:
                     "span", class_="descname"
                 ).text.strip()
                 text: Tag = supported_operation.find("dd", recursive=False)
-                desc = self._get_text(
-                    text, parsed_url
-                ).strip()
+                desc = self._get_text(text, parsed_url).strip()
                 items.append((operation, desc))
 
             if items:
@@ -542,7 +569,7 @@ class DocScraper:
         )
 
     async def _get_all_manual_documentations(self, url: str) -> List[Documentation]:
-        @executor()
+        @executor("parse")
         def bs4(content: str):
             strainer = SoupStrainer("dl")
 
@@ -574,7 +601,7 @@ class DocScraper:
 
         await self.log(updater, "Starting documentation caching", "documentation")
 
-        @executor()
+        @executor("parse")
         def bs4(content: str) -> List[set[str, str]]:
             soup = BeautifulSoup(content, "lxml")
 
@@ -628,6 +655,9 @@ class DocScraper:
         return results
 
     async def _wait_for_docs(self, name: str, updater: Callable = None):
+        if self.strgcls._docs_caching_task is None:  # not started, nothing to wait for
+            return discord.utils.get(self.strgcls._docs_cache, name=name) or False
+
         while True:
             if self.strgcls._docs_caching_task.cancelled():
                 await self.update(
@@ -700,9 +730,11 @@ class DocScraper:
         if getattr(self.strgcls, "_inv", None) is not None and not recache:
             return
 
-        partial = functools.partial(Inventory, url=self._inv_url)
-        loop = asyncio.get_running_loop()
-        self.strgcls._inv = await loop.run_in_executor(None, partial)
+        if self._inv_path is not None:
+            source = dict(fname_zlib=self._inv_path)
+        else:
+            source = dict(url=self._inv_url)
+        self.strgcls._inv = await run_in_pool("parse", Inventory, **source)
 
         await self.log(updater, "RTFM cache built", "rtfm")
 
@@ -727,16 +759,13 @@ class DocScraper:
         exclude_std: bool = False,
         updater: Callable = None,
     ) -> SearchResults:
-        if not self.strgcls._rtfm_caching_task.done():
+        task = self.strgcls._rtfm_caching_task
+        if task and not task.done():
             await self.update(updater, "Waiting for RTFM caching to be done")
-            await self.strgcls._rtfm_caching_task
+            await task
 
-        if self.strgcls._rtfm_caching_task.exception() and self.strgcls._inv is None:
-            raise FailedCachingTask(
-                "rtfm",
-                self.strgcls._rtfm_caching_task.exception(),
-                self.strgcls._rtfm_caching_task,
-            )
+        if task and task.exception() and self.strgcls._inv is None:
+            raise FailedCachingTask("rtfm", task.exception(), task)
 
         with Timer() as timer:
             # implement task error handling later
@@ -0,0 +1,136 @@
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from modules.util.metrics import metrics
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    """Collects the time spent in each stage of a single command invocation.
+
+    Spans of the same stage are summed, so every invocation adds one sample
+    per stage to the command_stage_seconds histogram when it finishes.
+    """
+
+    def __init__(self) -> None:
+        self.command: Optional[str] = None
+        self.failed = False
+        self.stages: Dict[str, float] = {}
+
+        self._start = time.perf_counter()
+
+    def add(self, stage: str, duration: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def finish(self) -> None:
+        if self.command is None:  # messages that did not invoke a command
+            return
+
+        took = time.perf_counter() - self._start
+        metrics.histogram("command_seconds", command=self.command).observe(took)
+
+        for stage, duration in self.stages.items():
+            metrics.histogram(
+                "command_stage_seconds", command=self.command, stage=stage
+            ).observe(duration)
+
+        outcome = "error" if self.failed else "success"
+        metrics.counter(
+            "command_invocations_total", command=self.command, outcome=outcome
+        ).inc()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Starts a trace for the current context, or joins the one already running.
+
+    Tasks copy the context when they are created, so spans in tasks started
+    during the trace are recorded to it as well.
+    """
+    running = _current.get()
+    if running is not None:
+        yield running
+        return
+
+    new = Trace()
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException:
+        new.failed = True
+        raise
+    finally:
+        _current.reset(token)
+        new.finish()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    running = _current.get()
+    if running is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        running.add(stage, time.perf_counter() - start)
+
+
+def traced(stage: str):
+    """Records the duration of a coroutine function as a span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _write_export(path: os.PathLike, text: str) -> None:
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+async def _export_loop(path: os.PathLike, interval: float) -> None:
+    # the executor module imports this one for its spans, so no executor decorator
+    loop = asyncio.get_running_loop()
+    while True:
+        text = metrics.format_prometheus()
+        await loop.run_in_executor(None, _write_export, path, text)
+        await asyncio.sleep(interval)
+
+
+async def setup(bot):
+    import config  # only the bot has a config, the tracing itself works without
+
+    settings = getattr(config, "tracing", None)
+    path = getattr(settings, "export_path", None)
+    if path and not getattr(bot, "metrics_export", None):
+        bot.metrics_export = asyncio.create_task(
+            _export_loop(path, settings.export_interval)
+        )
+
+
+async def teardown(bot):
+    task = getattr(bot, "metrics_export", None)
+    if task is not None:
+        task.cancel()
+        bot.metrics_export = None
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Deque, List, Optional
+
+from modules.util.metrics import metrics
+
+ROOT = os.getcwd()
+
+
+class Incident:
+    """A stall of the event loop, with the stack that was running while it was blocked"""
+
+    def __init__(self, stack: Optional[List[str]], task: Optional[str]) -> None:
+        self.time = datetime.now(timezone.utc)
+        self.stack = stack
+        self.task = task
+        self.duration: Optional[float] = None  # set once the loop runs again
+
+    @property
+    def location(self) -> str:
+        """The innermost frame of the bot's own code, where the blocking call was made"""
+        if not self.stack:
+            return "unknown"
+
+        for entry in reversed(self.stack):
+            if (
+                entry.lstrip().startswith(f'File "{ROOT}')
+                and "site-packages" not in entry
+            ):
+                return entry.strip().splitlines()[0]
+
+        return self.stack[-1].strip().splitlines()[0]
+
+
+class LoopWatchdog:
+    """Measures the lag of the event loop and captures the stack of whatever blocks it.
+
+    A task on the loop wakes up every interval and records how late it was.
+    A helper thread watches the heartbeat of that task, when it is older than
+    the threshold the loop is blocked, so the thread grabs the stack of the
+    loop's thread while the blocking call is still running.
+    """
+
+    def __init__(
+        self, interval: float = 0.25, threshold: float = 0.2, incidents: int = 50
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.incidents: Deque[Incident] = deque(maxlen=incidents)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._heartbeat = 0.0
+        self._pending: Optional[Incident] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        histogram = metrics.histogram("loop_lag_seconds")
+        while True:
+            before = time.monotonic()
+            self._heartbeat = before
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - before - self.interval)
+            histogram.observe(lag)
+
+            with self._lock:
+                incident, self._pending = self._pending, None
+
+            if incident is None and lag >= self.threshold:
+                # the stall ended before the thread looked, there is no stack for it
+                incident = Incident(None, None)
+                self.incidents.append(incident)
+
+            if incident is not None:
+                incident.duration = lag
+                metrics.counter("loop_stalls_total").inc()
+
+    def _capture(self) -> Incident:
+        frame: Optional[FrameType] = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame) if frame is not None else None
+
+        task = asyncio.current_task(self._loop)
+        return Incident(stack, task.get_name() if task is not None else None)
+
+    def _watch(self) -> None:
+        poll = min(self.interval, self.threshold) / 4
+        captured = None  # heartbeat of the stall that was captured already
+
+        while not self._stopped.wait(poll):
+            heartbeat = self._heartbeat
+            if heartbeat == captured:
+                continue
+
+            if time.monotonic() - heartbeat < self.interval + self.threshold:
+                continue
+
+            incident = self._capture()
+            captured = heartbeat
+            with self._lock:
+                if self._heartbeat != heartbeat:  # the loop resumed during the capture
+                    continue
+
+                self._pending = incident
+                self.incidents.append(incident)
+
+
+async def setup(bot):
+    import config  # only the bot has a config, like for the tracing
+
+    if getattr(bot, "watchdog", None):
+        return
+
+    settings = getattr(config, "watchdog", None)
+    bot.watchdog = LoopWatchdog(
+        interval=getattr(settings, "interval", 0.25),
+        threshold=getattr(settings, "threshold", 0.2),
+        incidents=getattr(settings, "incidents", 50),
+    )
+    bot.watchdog.start()
+
+
+async def teardown(bot):
+    watchdog = getattr(bot, "watchdog", None)
+    if watchdog is not None:
+        watchdog.stop()
+        bot.watchdog = None
@@ -0,0 +1,292 @@
+import asyncio
+import multiprocessing
+import time
+import traceback
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.util.metrics import metrics
+from modules.util.process import ResourceLimits
+from modules.util.tracing import span
+
+# the open pool of every name, reloaded modules replace their pool in here
+_pools: Dict[str, "WorkerPool"] = {}
+
+
+class WorkerCrashed(Exception):
+    def __init__(self, pool: str, exitcode: Optional[int], *args: object) -> None:
+        self.pool = pool
+        self.exitcode = exitcode
+
+        super().__init__(f"{pool} worker died with exit code {exitcode}", *args)
+
+
+class RemoteTraceback(Exception):
+    """Attached as the cause of exceptions raised inside a worker"""
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+
+def _dump_exception(exc: BaseException) -> tuple:
+    # exceptions with custom __init__ signatures don't survive a pickle round-trip
+    # on their own, so the state is shipped separately and restored in the parent
+    tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+    return type(exc), exc.args, exc.__dict__, tb
+
+
+def _load_exception(dump: tuple) -> BaseException:
+    cls, args, state, tb = dump
+    exc = cls.__new__(cls)
+    exc.args = args
+    exc.__dict__.update(state)
+    exc.__cause__ = RemoteTraceback(tb)
+    return exc
+
+
+def _worker_main(
+    conn: Connection,
+    initializer: Optional[Callable],
+    initargs: tuple,
+    limits: Optional[ResourceLimits],
+) -> None:
+    if limits is not None:
+        limits.apply()
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        if job is None:
+            return
+
+        func, args, kwargs = job
+        try:
+            message = ("ok", func(*args, **kwargs))
+        except Exception as exc:
+            message = ("error", _dump_exception(exc))
+
+        try:
+            conn.send(message + (metrics.drain(),))
+        except Exception as exc:  # unpicklable result
+            conn.send(("error", _dump_exception(exc), metrics.drain()))
+
+
+class _Worker:
+    def __init__(
+        self,
+        context: multiprocessing.context.BaseContext,
+        initializer: Optional[Callable],
+        initargs: tuple,
+        limits: Optional[ResourceLimits],
+    ) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, initializer, initargs, limits),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    async def call(self, job: tuple, pool: str) -> tuple:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_readable() -> None:
+            loop.remove_reader(fd)
+            if future.done():
+                return
+
+            try:
+                future.set_result(self.conn.recv())
+            except (EOFError, OSError):
+                self.process.join(timeout=1)
+                future.set_exception(WorkerCrashed(pool, self.process.exitcode))
+
+        try:
+            self.conn.send(job)
+        except OSError:
+            self.process.join(timeout=1)
+            raise WorkerCrashed(pool, self.process.exitcode)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            return await future
+        finally:
+            loop.remove_reader(fd)
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+
+class WorkerPool:
+    """A pool of warm worker processes that jobs are sent to over pipes.
+
+    Unlike a ProcessPoolExecutor a job that exceeds its timeout or gets cancelled
+    kills the worker running it, the worker is replaced by a fresh one.
+    Workers are started lazily on the first submission.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        *,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+        limits: Optional[ResourceLimits] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.size = workers
+        self.timeout = timeout
+
+        self._initializer = initializer
+        self._initargs = initargs
+        self._limits = limits
+        # forking a process with a running event loop and threads is unsafe
+        self._context = multiprocessing.get_context("spawn")
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._closed = False
+        _pools[name] = self
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self._initializer, self._initargs, self._limits)
+        self._workers.append(worker)
+        metrics.counter("worker_spawns_total", pool=self.name).inc()
+        return worker
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        self._workers.remove(worker)
+        if not self._closed:
+            self._idle.put_nowait(self._spawn())
+
+    def _start(self) -> None:
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+
+    async def submit(
+        self, func: Callable, *args, timeout: Optional[float] = None, **kwargs
+    ) -> Any:
+        """Runs a picklable function in a worker, arguments and results are pickled"""
+        if self._closed:
+            raise RuntimeError(f"{self.name} pool is closed")
+        if self._idle is None:
+            self._start()
+
+        timeout = timeout or self.timeout
+        queue_depth = metrics.gauge("worker_queue_depth", pool=self.name)
+
+        queue_depth.inc()
+        start = time.perf_counter()
+        try:
+            with span(f"{self.name}_queue"):
+                worker: _Worker = await self._idle.get()
+        finally:
+            queue_depth.dec()
+
+        metrics.histogram("worker_queue_seconds", pool=self.name).observe(
+            time.perf_counter() - start
+        )
+
+        job_seconds = metrics.histogram("worker_job_seconds", pool=self.name)
+        try:
+            with job_seconds.time(), span(self.name):
+                status, value, changes = await asyncio.wait_for(
+                    worker.call((func, args, kwargs), self.name), timeout
+                )
+        except asyncio.TimeoutError:
+            metrics.counter(
+                "worker_jobs_total", pool=self.name, outcome="timeout"
+            ).inc()
+            self._replace(worker)
+            raise
+        except asyncio.CancelledError:
+            metrics.counter(
+                "worker_jobs_total", pool=self.name, outcome="cancelled"
+            ).inc()
+            self._replace(worker)
+            raise
+        except WorkerCrashed:
+            metrics.counter(
+                "worker_jobs_total", pool=self.name, outcome="crashed"
+            ).inc()
+            self._replace(worker)
+            raise
+        except Exception:  # the job couldn't be pickled, the worker never saw it
+            self._idle.put_nowait(worker)
+            raise
+
+        self._idle.put_nowait(worker)
+        metrics.merge(changes)
+
+        if status == "error":
+            metrics.counter("worker_jobs_total", pool=self.name, outcome="error").inc()
+            raise _load_exception(value)
+
+        metrics.counter("worker_jobs_total", pool=self.name, outcome="ok").inc()
+        return value
+
+    def stats(self) -> dict:
+        """Returns the same statistics as executor.pool_stats does for thread pools"""
+        busy = 0 if self._idle is None else len(self._workers) - self._idle.qsize()
+        queue = metrics.histogram("worker_queue_seconds", pool=self.name)
+        run = metrics.histogram("worker_job_seconds", pool=self.name)
+        return {
+            "size": self.size,
+            "queued": metrics.gauge("worker_queue_depth", pool=self.name).value,
+            "active": busy,
+            "jobs": run.count,
+            "queue_p95": queue.percentile(95),
+            "run_p95": run.percentile(95),
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        if _pools.get(self.name) is self:
+            del _pools[self.name]
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+
+
+def get_worker_pool(name: str) -> WorkerPool:
+    """Returns the open pool of that name.
+
+    Functions held by modules that weren't reloaded look their pool up through
+    here, so they use the pool that replaced the one closed by a reload.
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        raise RuntimeError(f"{name} pool is closed")
+
+    return pool
+
+
+def worker_pools() -> List[WorkerPool]:
+    return list(_pools.values())
+
+
+async def setup(bot):
+    pass
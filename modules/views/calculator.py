@@ -1,7 +1,8 @@
 import discord
-import expr
 from discord.ext import commands
 
+from modules.util.calculator import evaluate
+
 from .base import View
 
 
@@ -24,9 +25,7 @@ class CalculatorButton(discord.ui.Button):
                 return
             try:
                 self.calc.field = str(
-                    await self.calc.ctx.bot.loop.run_in_executor(
-                        None, self.calc.state.evaluate, self.calc.field
-                    )
+                    await evaluate(self.calc.ctx.author.id, self.calc.field)
                 )
             except Exception as exc:
                 if hasattr(exc, "friendly"):
@@ -54,11 +53,6 @@ class CalculatorView(View):
         self.field = ""
         self.message: discord.Message = None
 
-        if context.author.id not in context.bot.expr_states:
-            context.bot.expr_states[context.author.id] = expr.create_state()
-
-        self.state: expr.state = context.bot.expr_states[context.author.id]
-
         self.button_map = [
             CalculatorButton(self, "(", style=discord.ButtonStyle.blurple, label="("),
             CalculatorButton(self, ")", style=discord.ButtonStyle.blurple, label=")"),
@@ -1,3 +1,5 @@
-from core.bot import bot
+if __name__ == "__main__":
+    # guarded so spawned worker processes don't start another bot
+    from core.bot import bot
 
-bot.startup()
+    bot.startup()
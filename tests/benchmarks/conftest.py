@@ -0,0 +1,152 @@
+"""Benchmarks for the imaging code, run with pytest from the repository root.
+
+Every benchmark records its mean time and the peak RSS growth while it ran.
+--bench-save writes them to the baseline file, later runs compare against it
+and fail benchmarks that got slower or grew more than --bench-threshold.
+The options are registered in the root conftest, pytest only accepts them there.
+Baselines are machine specific, so they are not checked in.
+"""
+import json
+import os
+import threading
+import time
+
+import psutil
+import pytest
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus")
+
+RSS_INTERVAL = 0.005  # seconds between rss samples
+RSS_TOLERANCE = 4 * 1024 * 1024  # 4 mb, growth below this is noise
+
+
+class RSSSampler:
+    """Samples the process' RSS in a thread and keeps the peak above the start"""
+
+    def __init__(self) -> None:
+        self.process = psutil.Process()
+        self.peak = 0
+
+        self._start = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss - self._start)
+            time.sleep(RSS_INTERVAL)
+
+    def __enter__(self) -> "RSSSampler":
+        self._start = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss - self._start)
+
+
+class Baseline:
+    def __init__(self, path: str, save: bool, threshold: float) -> None:
+        self.path = path
+        self.save = save
+        self.threshold = threshold
+        self.results = {}
+
+        self.stored = {}
+        if not save and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.stored = json.load(f)
+
+    def check(self, name: str, mean: float, peak_rss: int) -> None:
+        self.results[name] = {"mean": mean, "peak_rss": peak_rss}
+
+        stored = self.stored.get(name)
+        if stored is None:
+            return
+
+        failures = []
+        limit = 1 + self.threshold
+        if mean > stored["mean"] * limit:
+            failures.append(f"mean {mean:.4f}s, baseline {stored['mean']:.4f}s")
+        if peak_rss > max(stored["peak_rss"] * limit, RSS_TOLERANCE):
+            failures.append(
+                f"peak rss {peak_rss // 1024} kb, baseline {stored['peak_rss'] // 1024} kb"
+            )
+
+        if failures:
+            pytest.fail(f"{name} regressed: " + ", ".join(failures), pytrace=False)
+
+    def write(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=4, sort_keys=True)
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    config = request.config
+    baseline = Baseline(
+        config.getoption("--bench-baseline"),
+        config.getoption("--bench-save"),
+        config.getoption("--bench-threshold"),
+    )
+    yield baseline
+
+    if baseline.save and baseline.results:
+        baseline.write()
+
+
+@pytest.fixture
+def measure(request, benchmark, baseline):
+    """Benchmarks the function and checks the time and peak rss against the baseline.
+
+    A setup function runs untimed before every round, like clearing caches.
+    Slow functions can pass a fixed amount of rounds instead of calibrating.
+    """
+
+    def run(func, *args, setup=None, rounds=None, **kwargs):
+        with RSSSampler() as sampler:
+            if setup is None and rounds is None:
+                result = benchmark(func, *args, **kwargs)
+            else:
+                result = benchmark.pedantic(
+                    func, args=args, kwargs=kwargs, setup=setup, rounds=rounds or 5
+                )
+
+        benchmark.extra_info["peak_rss"] = sampler.peak
+        if benchmark.stats is not None:  # None with --benchmark-disable
+            baseline.check(
+                request.node.nodeid, benchmark.stats.stats.mean, sampler.peak
+            )
+
+        return result
+
+    return run
+
+
+def read_corpus(name: str) -> bytes:
+    with open(os.path.join(CORPUS_PATH, name), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="session")
+def texts() -> dict:
+    with open(os.path.join(CORPUS_PATH, "texts.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session", params=["static.png", "animated.gif", "huge.png"])
+def image(request) -> bytes:
+    return read_corpus(request.param)
+
+
+@pytest.fixture(scope="session", params=["animated.gif", "long.gif"])
+def gif(request) -> bytes:
+    return read_corpus(request.param)
+
+
+@pytest.fixture(scope="session")
+def long_gif() -> bytes:
+    return read_corpus("long.gif")
@@ -0,0 +1,63 @@
+"""Regenerates the benchmark corpus, the output is deterministic.
+
+Run from the repository root: python tests/benchmarks/make_corpus.py
+"""
+import json
+import math
+import os
+
+from PIL import Image, ImageDraw
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus")
+
+TEXTS = {
+    "short": "me when the",
+    "sentence": "when you finally fix the bug but it was a typo the whole time",
+    "paragraph": " ".join(["the quick brown fox jumps over the lazy dog"] * 12),
+    "lines": "first line\nsecond line\na much longer third line than the others",
+    "emoji": "when the 🔥🔥🔥 build passes on the first try 😳",
+    "limit": ("lorem ipsum dolor sit amet " * 40)[:1000],
+}
+
+
+def scene(size: tuple[int, int], t: float) -> Image.Image:
+    width, height = size
+    img = Image.new("RGB", size)
+    draw = ImageDraw.Draw(img)
+
+    for y in range(0, height, 4):
+        shade = int(255 * y / height)
+        draw.rectangle((0, y, width, y + 4), fill=(shade, 64, 255 - shade))
+
+    for index in range(6):
+        angle = t * 2 * math.pi + index * math.pi / 3
+        x = width / 2 + math.cos(angle) * width / 3
+        y = height / 2 + math.sin(angle) * height / 3
+        radius = min(width, height) / 10
+        color = ((index * 40) % 256, 255 - index * 30, index * 50 % 256)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+
+    return img
+
+
+def animation(path: str, size: tuple[int, int], frames: int, duration: int):
+    images = [scene(size, index / frames) for index in range(frames)]
+    images[0].save(
+        path, save_all=True, append_images=images[1:], duration=duration, loop=0
+    )
+
+
+def main():
+    os.makedirs(CORPUS_PATH, exist_ok=True)
+
+    scene((800, 600), 0).save(os.path.join(CORPUS_PATH, "static.png"))
+    scene((4000, 3000), 0.25).save(os.path.join(CORPUS_PATH, "huge.png"))
+    animation(os.path.join(CORPUS_PATH, "animated.gif"), (320, 240), 48, 40)
+    animation(os.path.join(CORPUS_PATH, "long.gif"), (160, 120), 1200, 20)
+
+    with open(os.path.join(CORPUS_PATH, "texts.json"), "w", encoding="utf-8") as f:
+        json.dump(TEXTS, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
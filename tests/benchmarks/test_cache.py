@@ -0,0 +1,18 @@
+import asyncio
+
+# the render cache only needs the executor, it runs without wand
+from modules.util.imaging.render_cache import RenderCache, make_key
+
+
+def test_make_key(measure, image):
+    measure(make_key, "caption", image, "some caption text")
+
+
+def test_render_cache_disk_hit(measure, tmp_path, image):
+    cache = RenderCache(str(tmp_path), 0, 64 * 1024 * 1024)  # nothing stays in memory
+    asyncio.run(cache.put("key", image, False))
+
+    def get():
+        return asyncio.run(cache.get("key"))
+
+    assert measure(get) == (image, False)
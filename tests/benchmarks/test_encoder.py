@@ -0,0 +1,42 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageSequence
+
+# the encoder only needs pillow, it runs without wand
+from modules.util.imaging import encoder
+
+
+def encode(data: bytes, optimize: bool):
+    buffer = BytesIO()
+    with Image.open(BytesIO(data)) as img, encoder.GifEncoder(
+        buffer, optimize=optimize
+    ) as gif:
+        for frame in ImageSequence.Iterator(img):
+            # optimized frames have to be opaque
+            converted = frame.convert("RGB" if optimize else "RGBA")
+            gif.add_frame(converted, frame.info.get("duration", 0))
+            converted.close()
+
+    return buffer, gif
+
+
+@pytest.mark.parametrize("optimize", [False, True], ids=["full", "optimized"])
+def test_gif_encoder(measure, gif, optimize):
+    buffer, encoded = measure(encode, gif, optimize, rounds=3)
+
+    buffer.seek(0)
+    with Image.open(buffer) as img:
+        assert img.n_frames == encoded.frames
+
+
+def test_choose_smallest_webp(measure, gif):
+    buffer, encoded = encode(gif, optimize=True)
+
+    def choose():
+        buffer.seek(0)
+        # a tiny target makes it try the webp transcode
+        return encoder.choose_smallest(buffer, encoded, 1)
+
+    _, info = measure(choose, rounds=3)
+    assert info.format in ("gif", "webp")
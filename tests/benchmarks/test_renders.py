@@ -0,0 +1,38 @@
+import pytest
+
+# the renderer needs wand and imagetext, like the bot itself
+renderer = pytest.importorskip("modules.util.imaging.renderer", exc_type=ImportError)
+text = pytest.importorskip("modules.util.imaging.text")
+
+Renders = renderer.Renders
+
+
+def clear_text_caches():
+    text.layout_cache.clear()
+    text.metrics_cache.clear()
+    text.band_cache.clear()
+
+
+@pytest.mark.parametrize(
+    "name", ["short", "sentence", "paragraph", "lines", "emoji", "limit"]
+)
+def test_centered_text(measure, texts, name):
+    measure(Renders.centered_text, texts[name], setup=clear_text_caches)
+
+
+@pytest.mark.parametrize("name", ["short", "paragraph"])
+def test_caption(measure, texts, image, name):
+    measure(Renders.caption, image, texts[name], setup=clear_text_caches)
+
+
+def test_caption_cached_text(measure, texts, image):
+    measure(Renders.caption, image, texts["sentence"])
+
+
+def test_caption_long_gif(measure, texts, long_gif):
+    measure(Renders.caption, long_gif, texts["sentence"], rounds=3)
+
+
+def test_caption_size_target(measure, texts, long_gif):
+    # a tiny target makes the caption try the webp fallback
+    measure(Renders.caption, long_gif, texts["sentence"], size_target=1, rounds=3)
@@ -0,0 +1,72 @@
+import math
+import os
+
+import pytest
+
+# only imagetext is needed, the text layout doesn't go through wand
+imagetext = pytest.importorskip("imagetext_py")
+text = pytest.importorskip("modules.util.imaging.text")
+
+FONTS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "fonts")
+FONT = "arial-unicode-ms arabic"
+WIDTH = math.floor(512 * 0.85)
+HEIGHT = 512
+
+NAMES = ["short", "sentence", "paragraph", "lines", "limit"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def fonts():
+    imagetext.FontDB.LoadFromDir(FONTS_PATH)
+
+
+def clear_text_caches():
+    text.layout_cache.clear()
+    text.metrics_cache.clear()
+
+
+def binary_search(content: str, width: int, height: int, min_size=5, max_size=75):
+    """The search over font sizes fit_text replaced, kept as the reference"""
+    query = imagetext.FontDB.Query(FONT)
+
+    def wrap(size):
+        wrapped = imagetext.text_wrap(
+            content,
+            width,
+            size,
+            query,
+            wrap_style=imagetext.WrapStyle.Character,
+            draw_emojis=True,
+        )
+        _, wrapped_height = imagetext.text_size_multiline(
+            wrapped, size, query, draw_emojis=True
+        )
+        return wrapped, wrapped_height
+
+    while min_size < max_size:
+        size = (min_size + max_size) // 2
+        _, wrapped_height = wrap(size)
+
+        if wrapped_height > height:
+            max_size = size - 1
+        else:
+            min_size = size + 1
+
+    wrapped, _ = wrap(min_size)
+    return wrapped, min_size
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_fit_text(measure, texts, name):
+    _, size = measure(
+        text.fit_text, texts[name], FONT, WIDTH, HEIGHT, 5, 75, setup=clear_text_caches
+    )
+
+    # the fit measures once and scales, it may land one size off the search
+    _, searched = binary_search(texts[name], WIDTH, HEIGHT)
+    assert abs(size - searched) <= 1
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_fit_text_binary_search(measure, texts, name):
+    measure(binary_search, texts[name], WIDTH, HEIGHT, setup=clear_text_caches)
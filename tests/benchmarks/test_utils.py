@@ -0,0 +1,51 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+
+# the processor is built on wand, which needs imagemagick installed
+utils = pytest.importorskip("modules.util.imaging.utils", exc_type=ImportError)
+
+SequentialImageProcessor = utils.SequentialImageProcessor
+
+
+@pytest.mark.parametrize("count", [7, 28])
+def test_fit_images(measure, image, count):
+    measure(utils.fit_images, [image] * count)
+
+
+def process(data: bytes, operations) -> BytesIO:
+    processor = SequentialImageProcessor(data)
+    for operation, args in operations:
+        getattr(processor, operation)(*args)
+    return asyncio.run(processor.save())
+
+
+@pytest.mark.parametrize(
+    "operations",
+    [
+        [("crop_to_center", ())],
+        [("resize_keep_ratio", ((256, 256),))],
+        [("invert", ())],
+        [("crop_to_center", ()), ("resize_keep_ratio", ((256, 256),)), ("invert", ())],
+        [("change_format", ("jpeg",)), ("crop_to_center", ())],
+    ],
+    ids=["crop", "resize", "invert", "chain", "makesweet"],
+)
+def test_processor(measure, image, operations):
+    measure(process, image, operations)
+
+
+def dominant_colors(data: bytes) -> list:
+    async def run():
+        processor = SequentialImageProcessor(data)
+        try:
+            return await processor.get_dominant_colors()
+        finally:
+            await processor.close()
+
+    return asyncio.run(run())
+
+
+def test_dominant_colors(measure, image):
+    measure(dominant_colors, image)
@@ -0,0 +1,67 @@
+"""Freezes the documentation fixtures the harness runs against, needs network once.
+
+Run from the repository root: python tests/docs/freeze.py [--ref v2.1.0]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import urllib.request
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures")
+BASE_URL = "https://dpy.rtd.amyr.in/"
+REPO_URL = "https://github.com/Rapptz/discord.py"
+
+
+def download(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": "amyrin-bot"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def save(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def freeze_pages(path: str) -> None:
+    index = download(BASE_URL)
+    save(os.path.join(path, "index.html"), index)
+
+    # the same manuals the scraper caches
+    soup = BeautifulSoup(index, "lxml")
+    for item in soup.find("section", id="manuals").find_all("li", class_="toctree-l1"):
+        href = item.find("a").get("href").split("#")[0]
+        print(f"saving {href}")
+        save(os.path.join(path, href), download(urljoin(BASE_URL, href)))
+
+
+def freeze_source(path: str, ref: str) -> None:
+    repo = os.path.join(path, "discord.py")
+    shutil.rmtree(repo, ignore_errors=True)
+    subprocess.run(
+        ["git", "clone", "--depth", "1", "--branch", ref, "--", REPO_URL, repo],
+        check=True,
+    )
+    shutil.rmtree(os.path.join(repo, ".git"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ref", default="v2.1.0", help="discord.py tag to freeze")
+    args = parser.parse_args()
+
+    save(
+        os.path.join(FIXTURES_PATH, "objects.inv"),
+        download(urljoin(BASE_URL, "objects.inv")),
+    )
+    freeze_pages(os.path.join(FIXTURES_PATH, "pages"))
+    freeze_source(os.path.join(FIXTURES_PATH, "rtfs"), args.ref)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Measures the documentation, rtfm and rtfs caches offline against frozen fixtures.
+
+Reports the build time and memory of every cache and the query latency
+percentiles for the query corpus. Freeze the fixtures first with freeze.py.
+
+Run from the repository root: PYTHONPATH=. python tests/docs/harness.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import psutil
+
+from modules.util.scraping.documentation.discord_py import DocScraper
+
+DOCS_PATH = os.path.dirname(__file__)
+FIXTURES_PATH = os.path.join(DOCS_PATH, "fixtures")
+QUERIES_PATH = os.path.join(DOCS_PATH, "queries.json")
+
+
+class Build:
+    """Times a cache build and tracks the python heap and rss it needs"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.took = 0.0
+        self.peak = 0  # bytes allocated at most during the build
+        self.retained = 0  # bytes still allocated after it
+        self.rss = 0
+
+        self._process = psutil.Process()
+        self._start = 0.0
+        self._rss = 0
+
+    def __enter__(self) -> "Build":
+        tracemalloc.start()
+        self._rss = self._process.memory_info().rss
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.took = time.perf_counter() - self._start
+        self.retained, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.rss = self._process.memory_info().rss - self._rss
+
+    def to_json(self) -> dict:
+        return {
+            "took": self.took,
+            "peak": self.peak,
+            "retained": self.retained,
+            "rss": self.rss,
+        }
+
+
+def percentiles(samples: list[float]) -> dict:
+    if len(samples) < 2:
+        samples = samples * 2
+
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p90": cuts[89],
+        "p99": cuts[98],
+        "max": max(samples),
+    }
+
+
+async def time_queries(search, queries: list[str], rounds: int) -> list[float]:
+    samples = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            await search(query)
+            samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def megabytes(value: int) -> str:
+    return f"{value / 1024 / 1024:.1f} mb"
+
+
+async def run(fixtures: str, queries: dict, rounds: int) -> dict:
+    storage = SimpleNamespace()
+    scraper = DocScraper(
+        bot=storage,
+        autostart=False,
+        inventory=os.path.join(fixtures, "objects.inv"),
+        rtfs_root=os.path.join(fixtures, "rtfs"),
+        pages=os.path.join(fixtures, "pages"),
+    )
+
+    builds = [Build("rtfm"), Build("rtfs"), Build("docs")]
+    rtfm, rtfs, docs = builds
+
+    with rtfm:
+        await scraper._build_rtfm_cache()
+
+    storage._rtfs_cache = []
+    repo, _, _, dir_name = scraper._rtfs_repo
+    with rtfs:
+        await scraper._rtfs_index_directory(
+            os.path.join(fixtures, "rtfs", repo, dir_name)
+        )
+
+    with docs:
+        await scraper._cache_all_documentations()
+
+    latencies = {
+        "rtfm": await time_queries(
+            lambda query: scraper.search(query, limit=8), queries["rtfm"], rounds
+        ),
+        "rtfs": await time_queries(
+            lambda query: scraper.rtfs_search(query, limit=8), queries["rtfs"], rounds
+        ),
+        "docs": await time_queries(scraper.get_documentation, queries["docs"], rounds),
+    }
+
+    return {
+        "entries": {
+            "rtfm": len(storage._inv.objects),
+            "rtfs": len(storage._rtfs_cache),
+            "docs": len(storage._docs_cache),
+        },
+        "builds": {build.name: build.to_json() for build in builds},
+        "queries": {name: percentiles(samples) for name, samples in latencies.items()},
+    }
+
+
+def report(results: dict) -> None:
+    print(
+        f"{'build':<6} {'entries':>8} {'took':>9} {'peak':>10} {'retained':>10} {'rss':>10}"
+    )
+    for name, build in results["builds"].items():
+        print(
+            f"{name:<6} {results['entries'][name]:>8} {build['took']:>8.3f}s "
+            f"{megabytes(build['peak']):>10} {megabytes(build['retained']):>10} "
+            f"{megabytes(build['rss']):>10}"
+        )
+
+    print()
+    print(f"{'query':<6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for name, cuts in results["queries"].items():
+        print(
+            f"{name:<6} "
+            + " ".join(
+                f"{cuts[cut] * 1000:>7.2f}ms" for cut in ("p50", "p90", "p99", "max")
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    results = asyncio.run(run(args.fixtures, queries, args.rounds))
+    report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+
+from modules.util.imaging import render_cache
+from modules.util.imaging.render_cache import RenderCache
+
+
+def test_cached_render_miss_then_hit(tmp_path, monkeypatch):
+    # the renderer needs wand and imagetext, like the bot itself
+    renderer = pytest.importorskip(
+        "modules.util.imaging.renderer", exc_type=ImportError
+    )
+    cache = RenderCache(str(tmp_path), 1024 * 1024, 1024 * 1024)
+    monkeypatch.setattr(renderer, "render_cache", cache)
+
+    calls = []
+
+    async def caption(image: bytes, text: str):
+        calls.append((image, text))
+        return BytesIO(image + text.encode()), False
+
+    async def run():
+        miss = await renderer.cached_render(caption, b"image", "text")
+        hit = await renderer.cached_render(caption, b"image", "text")
+        return miss, hit
+
+    miss, hit = asyncio.run(run())
+
+    assert calls == [(b"image", "text")]
+    assert not miss.cached and hit.cached
+    assert hit.buffer.getvalue() == miss.buffer.getvalue() == b"imagetext"
+    assert hit.is_animated is False
+
+
+def test_concurrent_disk_hits_share_one_read(tmp_path, monkeypatch):
+    async def run():
+        await RenderCache(str(tmp_path), 0, 1024).put("key", b"output", True)
+
+        reads = []
+        read_file = render_cache._read_file
+
+        async def counting_read(path):
+            reads.append(path)
+            return await read_file(path)
+
+        monkeypatch.setattr(render_cache, "_read_file", counting_read)
+
+        cache = RenderCache(str(tmp_path), 1024, 1024)  # a restart, memory is empty
+        results = await asyncio.gather(*(cache.get("key") for _ in range(5)))
+        return reads, results
+
+    reads, results = asyncio.run(run())
+
+    assert len(reads) == 1
+    assert results == [(b"output", True)] * 5
+
+
+def test_disk_eviction_removes_files(tmp_path):
+    async def run():
+        cache = RenderCache(str(tmp_path), 0, 10)
+        await cache.put("old", b"123456", False)
+        await cache.put("new", b"abcdef", False)
+        return cache
+
+    cache = asyncio.run(run())
+
+    assert sorted(os.listdir(tmp_path)) == ["new-0"]
+    assert cache._disk_size == 6